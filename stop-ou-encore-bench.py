@@ -0,0 +1,332 @@
+# Times the hot paths on synthetic ARRM consoles of 1k, 10k and 100k games
+# without opening a window: the core module is driven directly and the GUI
+# script is only imported for its thumbnail decoder and row colouring.
+# Every stage runs twice, once for wall time and once under tracemalloc for
+# peak memory, and each result is appended as a JSON line to the results file.
+#
+#   python stop-ou-encore-bench.py
+#   python stop-ou-encore-bench.py --sizes 1000,10000 --data-dir /tmp/soe-bench --keep
+import argparse
+import gc
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from xml.sax.saxutils import escape
+from stop_ou_encore_core import (
+    UNTAGGED, ACCEPTED, REJECTED, HOLD, PROGRESS_SECTIONS, GameStore, ProgressStore, TextSpool,
+    GamelistLoader, FilterIndex, letter_bucket, ExportOptions, ExportJob,
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+GUI_SCRIPT = os.path.join(SCRIPT_DIR, 'stop-ou-encore-v0.9.py')
+
+TITLE_WORDS = ('Super', 'Mega', 'Star', 'Dragon', 'Quest', 'Fighter', 'Racing', 'Soccer', 'Legend', 'Castle',
+               'Ninja', 'Space', 'Adventure', 'Island', 'World', 'Puzzle', 'Tennis', 'Golf', 'Warrior', 'Knight')
+REGION_TAGS = (('USA', 'us'), ('Europe', 'eu'), ('Japan', 'jp'), ('World', 'wor'))
+EXTRA_TAGS = ('', '', '', '', ' (Rev 1)', ' (Beta)', ' (Proto)', ' (Disc 1)')
+# Fraction of games tagged in the synthetic progress file, per status
+PROGRESS_SHARE = ((ACCEPTED, 0.3), (REJECTED, 0.2), (HOLD, 0.05))
+
+def load_gui_module():
+    # The GUI script needs Tk and PIL to import, but not a display
+    try:
+        spec = importlib.util.spec_from_file_location('stop_ou_encore_gui', GUI_SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except ImportError:
+        return None
+    return module
+
+def sample_image(width, height):
+    # A smooth gradient keeps the JPEG at a few KB; every game gets a copy,
+    # so this is what the media tree and the exports scale with
+    try:
+        from PIL import Image
+    except ImportError:
+        return b'\x89PNG\r\n\x1a\n'  # Enough for the export stages
+    image = Image.new('RGB', (width, height))
+    image.putdata([(x * 255 // width, y * 255 // height, 128) for y in range(height) for x in range(width)])
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=85)
+    return output.getvalue()
+
+def write_console(console_dir, count, rom_size, image_size=(160, 120), seed=0):
+    # ARRM-style gamelist.xml with a ROM and an image per game, plus a legacy
+    # progress file tagging about half of them
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(console_dir, 'roms'), exist_ok=True)
+    os.makedirs(os.path.join(console_dir, 'images'), exist_ok=True)
+    image_data = sample_image(*image_size)
+    rom_data = bytes(rng.getrandbits(8) for _ in range(rom_size))
+    paths = []
+    with open(os.path.join(console_dir, 'gamelist.xml'), 'w', encoding='utf-8') as file:
+        file.write('<?xml version="1.0"?>\n<gameList>\n')
+        for i in range(count):
+            # Three regional releases per title, so duplicates exist; the
+            # words come from their own RNG so all three pick the same ones
+            title_rng = random.Random(f"{seed}:{i // 3}")
+            title = ' '.join(title_rng.sample(TITLE_WORDS, 3)) + f' {i // 3}'
+            region_name, region = rng.choice(REGION_TAGS)
+            name = f"{title} ({region_name}){rng.choice(EXTRA_TAGS)}"
+            rom_path = f"./roms/{i:06d}.zip"
+            image_path = f"./images/{i:06d}.jpg"
+            desc = ' '.join(rng.choice(TITLE_WORDS).lower() for _ in range(rng.randint(20, 80)))
+            with open(os.path.join(console_dir, rom_path), 'wb') as rom:
+                rom.write(rom_data)
+            with open(os.path.join(console_dir, image_path), 'wb') as image:
+                image.write(image_data)
+            file.write(
+                f'\t<game>\n\t\t<path>{escape(rom_path)}</path>\n\t\t<name>{escape(name)}</name>\n'
+                f'\t\t<desc>{escape(desc)}</desc>\n\t\t<image>{escape(image_path)}</image>\n'
+                f'\t\t<rating>{rng.randint(0, 10) / 10}</rating>\n\t\t<releasedate>{1985 + i % 15}0101T000000</releasedate>\n'
+                f'\t\t<developer>Studio {i % 97}</developer>\n\t\t<publisher>Publisher {i % 31}</publisher>\n'
+                f'\t\t<genre>{rng.choice(TITLE_WORDS)}</genre>\n\t\t<players>{rng.randint(1, 4)}</players>\n'
+                f'\t\t<region>{region}</region>\n\t</game>\n'
+            )
+            paths.append(rom_path)
+        file.write('</gameList>\n')
+
+    sections = {status: [] for _, status in PROGRESS_SECTIONS}
+    for path in paths:
+        roll = rng.random()
+        for status, share in PROGRESS_SHARE:
+            if roll < share:
+                sections[status].append(path)
+                break
+            roll -= share
+    with open(os.path.join(console_dir, 'bench_progress.txt'), 'w') as file:
+        for i, (header, status) in enumerate(PROGRESS_SECTIONS):
+            file.write(f"{header}\n" if i == 0 else f"\n{header}\n")
+            file.writelines(f"{path}\n" for path in sections[status])
+
+def prepare_console(data_dir, count, rom_size, image_size):
+    # Reuses a console from an earlier run if it was made with the same sizes
+    console_dir = os.path.join(data_dir, f"games_{count}")
+    marker = os.path.join(console_dir, '.complete')
+    settings = f"{rom_size} {image_size[0]}x{image_size[1]}"
+    try:
+        with open(marker, 'r') as file:
+            complete = file.read() == settings
+    except OSError:
+        complete = False
+    if not complete:
+        shutil.rmtree(console_dir, ignore_errors=True)
+        write_console(console_dir, count, rom_size, image_size)
+        with open(marker, 'w') as file:
+            file.write(settings)
+    return console_dir
+
+def measure(stage, setup=None, memory=True):
+    # Returns (result of the timed run, seconds, peak traced bytes)
+    if setup:
+        setup()
+    gc.collect()
+    start = time.perf_counter()
+    result = stage()
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        if setup:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        stage()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+def bench_load(console_dir):
+    # Same work as GameApp.load_gamelist/add_loaded_games, minus the widgets
+    store = GameStore()
+    filter_index = FilterIndex(store)
+    loader = GamelistLoader(os.path.join(console_dir, 'gamelist.xml'), TextSpool())
+    loader.run()
+    duplicates = None
+    while not loader.queue.empty():
+        kind, payload, _, _ = loader.queue.get()
+        if kind == 'games':
+            for game in payload:
+                filter_index.add(store.add(game), game.name)
+        elif kind == 'done':
+            duplicates = payload
+        else:
+            raise payload
+    return store, filter_index, duplicates
+
+def bench_update_listbox(app):
+    # The filters a curator flips through: everything, a letter, a status,
+    # a search, and the duplicates view
+    queries = [
+        (None, None, None, None),
+        (letter_bucket(app.store.games[0].name), None, None, None),
+        (None, ACCEPTED, None, None),
+        (None, None, 'dragon', None),
+        (None, None, None, app.duplicates.ids()),
+    ]
+    rows = 0
+    for letter, status, text, subset in queries:
+        filtered = app.filter_index.query(letter, status, text, subset)
+        games = app.store.games
+        names = [games[game_id].name for game_id in filtered]
+        rows += len(names)
+    return rows
+
+def bench_listbox_colors(app, game_color):
+    # Worst case: every row of the unfiltered list repainted once
+    return [game_color(app, game_id) for game_id in range(len(app.store))]
+
+def bench_load_progress(app, console_dir, journal_path):
+    progress = ProgressStore(journal_path, app.store)
+    progress.import_legacy(os.path.join(console_dir, 'bench_progress.txt'))
+    progress.close()
+    # And replaying the journal it produced, as on the next start
+    restored = ProgressStore(journal_path, app.store).restore()
+    return restored
+
+def bench_show_game(app, console_dir, samples, decode_thumbnail):
+    # Field reads, the spooled description and the thumbnail decode
+    games = app.store.games
+    step = max(1, len(games) // samples)
+    shown = 0
+    for game_id in range(0, len(games), step)[:samples]:
+        game = games[game_id]
+        text = (game['name'], game['path'], game.get('region', 'Unknown'), game.get('desc', ''))
+        if decode_thumbnail is not None and game.get('image'):
+            decode_thumbnail(os.path.join(console_dir, game['image']))
+        shown += bool(text)
+    return shown
+
+def bench_export(app, console_dir, export_dir, incremental):
+    games = [app.store.games[game_id] for game_id in app.store.ids_with_status(ACCEPTED)]
+    job = ExportJob(games, console_dir, export_dir, ExportOptions(incremental=incremental))
+    job.run()
+    kind, payload = job.queue.get()
+    if kind == 'error':
+        raise payload
+    plan, errors = payload
+    if errors:
+        raise OSError(f"{len(errors)} files failed to export, first: {errors[0]}")
+    return len(plan.entries)
+
+def git_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.strip() or None
+
+def max_rss_kb():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage // 1024 if sys.platform == 'darwin' else usage  # bytes on macOS
+
+def run_size(count, args, gui, work_dir):
+    console_dir = prepare_console(args.data_dir, count, args.rom_size, args.image_size)
+    journal_path = os.path.join(work_dir, f"bench_{count}.journal")
+    export_dir = os.path.join(work_dir, f"export_{count}")
+
+    def reset_progress():
+        for game_id in range(len(app.store)):
+            app.store.set_status(game_id, UNTAGGED)
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+
+    def reset_export():
+        shutil.rmtree(export_dir, ignore_errors=True)
+
+    results = []
+
+    def record(stage, run, setup=None, units=None):
+        result, seconds, peak = measure(run, setup, memory=not args.no_memory)
+        results.append({'games': count, 'stage': stage, 'seconds': round(seconds, 6), 'peak_bytes': peak,
+                        'items': units(result) if units else None, 'max_rss_kb': max_rss_kb()})
+        peak_text = f"{peak / 1024 / 1024:8.1f} MB" if peak is not None else "       -   "
+        print(f"{count:>8} {stage:<26} {seconds:9.3f} s {peak_text}", flush=True)
+        return result
+
+    store, filter_index, duplicates = record('load_gamelist', lambda: bench_load(console_dir), units=lambda r: len(r[0]))
+    app = SimpleNamespace(store=store, filter_index=filter_index, duplicates=duplicates)
+    # Progress first, so the filters, colours and export see tagged games
+    record('load_progress', lambda: bench_load_progress(app, console_dir, journal_path), reset_progress,
+           units=lambda restored: restored)
+    record('update_listbox', lambda: bench_update_listbox(app), units=lambda rows: rows)
+    if gui is not None:
+        record('update_listbox_colors', lambda: bench_listbox_colors(app, gui.GameApp.game_color), units=len)
+    decode = gui.decode_thumbnail if gui is not None else None
+    record('show_game', lambda: bench_show_game(app, console_dir, args.show_samples, decode),
+           units=lambda shown: shown)
+    record('export_games', lambda: bench_export(app, console_dir, export_dir, False), reset_export,
+           units=lambda files: files)
+    record('export_games_incremental', lambda: bench_export(app, console_dir, export_dir, True),
+           units=lambda files: files)
+    shutil.rmtree(export_dir, ignore_errors=True)
+    return results
+
+def parse_image_size(value):
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {value!r}")
+    if width < 1 or height < 1:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {value!r}")
+    return width, height
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark stop-ou-encore on synthetic gamelists.")
+    parser.add_argument('--sizes', default='1000,10000,100000', help="comma-separated game counts")
+    parser.add_argument('--data-dir', help="where synthetic consoles are generated and reused "
+                        "(default: a temporary directory removed afterwards)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated data")
+    parser.add_argument('--rom-size', type=int, default=2048, help="bytes per dummy ROM")
+    parser.add_argument('--image-size', type=parse_image_size, default=(160, 120), metavar='WxH',
+                        help="dimensions of the dummy JPEG given to every game (default: 160x120)")
+    parser.add_argument('--show-samples', type=int, default=200, help="games shown in the show_game stage")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc runs")
+    parser.add_argument('--output', default=os.path.join(SCRIPT_DIR, 'benchmark-results.jsonl'),
+                        help="results file, one JSON object per stage is appended")
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    temporary = args.data_dir is None
+    if temporary:
+        args.data_dir = tempfile.mkdtemp(prefix='stop-ou-encore-bench-')
+    gui = load_gui_module()
+    if gui is None:
+        print("Tk or PIL is not installed: update_listbox_colors and image decoding are skipped.", flush=True)
+
+    run = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': git_commit(),
+           'python': platform.python_version(), 'platform': platform.platform()}
+    print(f"{'games':>8} {'stage':<26} {'wall time':>11} {'peak mem':>11}", flush=True)
+    try:
+        with tempfile.TemporaryDirectory(prefix='stop-ou-encore-bench-work-') as work_dir:
+            for count in sizes:
+                results = run_size(count, args, gui, work_dir)
+                with open(args.output, 'a', encoding='utf-8') as file:
+                    file.writelines(json.dumps({**run, **result}) + "\n" for result in results)
+    finally:
+        if temporary and not args.keep:
+            shutil.rmtree(args.data_dir, ignore_errors=True)
+        elif temporary:
+            print(f"Synthetic data kept in {args.data_dir}")
+    print(f"Results appended to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
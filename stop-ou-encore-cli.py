@@ -0,0 +1,199 @@
+# Headless front end: load a console's gamelist, tag games from progress
+# files and/or rules, then export the accepted games. Does not need Tk,
+# PIL or a display, so it can run on a NAS or over SSH.
+#
+#   python stop-ou-encore-cli.py /roms/snes --progress snes_progress.txt --export /mnt/sd/snes
+#   python stop-ou-encore-cli.py /roms/snes --rules rules.json --export /mnt/sd/snes --dry-run --json
+import argparse
+import json
+import os
+import sys
+import time
+from stop_ou_encore_core import (
+    ACCEPTED, STATUS_NAMES, GameStore, ProgressStore, TextSpool,
+    RecordBuilder, iter_gamelist, find_duplicate_groups, read_any_progress_file, load_rules,
+    plan_auto_tag, format_size, EXPORT_MODES, ExportOptions, ExportJob, TIMINGS,
+)
+
+# Seconds between progress lines while loading or exporting
+REPORT_INTERVAL = 0.5
+
+class Reporter:
+    # Prints one JSON object per line with --json, readable text otherwise
+    def __init__(self, json_lines):
+        self.json_lines = json_lines
+
+    def event(self, kind, text, **fields):
+        if self.json_lines:
+            print(json.dumps({'event': kind, **fields}), flush=True)
+        else:
+            print(text, flush=True)
+
+    def error(self, text):
+        if self.json_lines:
+            print(json.dumps({'event': 'error', 'message': text}), flush=True)
+        else:
+            print(f"Error: {text}", file=sys.stderr, flush=True)
+
+def status_counts(store):
+    return {name: store.count(status) for name, status in STATUS_NAMES.items()}
+
+def load_games(gamelist_path, store, reporter):
+    builder = RecordBuilder(TextSpool())
+    last_report = time.monotonic()
+    for game_data, bytes_read, total in iter_gamelist(gamelist_path):
+        store.add(builder.build(game_data))
+        now = time.monotonic()
+        if now - last_report >= REPORT_INTERVAL:
+            reporter.event('loading', f"Loading gamelist... {len(store)} games",
+                           games=len(store), bytes_read=bytes_read, total_bytes=total)
+            last_report = now
+
+def report_timings(reporter):
+    summary = TIMINGS.summary()
+    for name, stats in summary.items():
+        reporter.event('timing', f"{name}: {stats['count']} x, p50 {stats['p50'] * 1000:.1f} ms, "
+                       f"p90 {stats['p90'] * 1000:.1f} ms, max {stats['max'] * 1000:.1f} ms",
+                       operation=name, **stats)
+
+def run_export(args, store, reporter):
+    games = [store.games[game_id] for game_id in store.ids_with_status(ACCEPTED)]
+    if not games:
+        reporter.error("No accepted games to export!")
+        return 1
+    options = ExportOptions(args.mode, args.incremental, args.verify_hash, args.workers)
+    job = ExportJob(games, args.console_dir, args.export, options, dry_run=args.dry_run)
+    job.start()
+    try:
+        while job.is_alive():
+            job.join(REPORT_INTERVAL)
+            bytes_done, total_bytes, files_done, total_files, current = job.progress.snapshot()
+            if total_files and job.is_alive():
+                reporter.event(
+                    'exporting',
+                    f"Copying {files_done}/{total_files} files, {format_size(bytes_done)} of {format_size(total_bytes)}",
+                    files_done=files_done, total_files=total_files, bytes_done=bytes_done,
+                    total_bytes=total_bytes, current=current,
+                )
+    except KeyboardInterrupt:
+        # Files already copied are journaled, so the next run resumes
+        job.cancel()
+        job.join()
+
+    kind, payload = job.queue.get()
+    if kind == 'error':
+        reporter.error(f"Export failed: {payload}")
+        return 1
+    plan, details = payload
+    if kind == 'planned':
+        for (src, dst, size), action in zip(plan.entries, details):
+            reporter.event('plan', f"{action}: {src} -> {dst} ({format_size(size)})",
+                           action=action, src=src, dst=dst, size=size)
+        transfer_bytes = sum(size for (_, _, size), action in zip(plan.entries, details) if action != 'skip')
+        reporter.event(
+            'planned',
+            f"{len(plan.entries)} files, {format_size(plan.total_bytes)} total, {format_size(transfer_bytes)} to transfer",
+            files=len(plan.entries), total_bytes=plan.total_bytes, transfer_bytes=transfer_bytes,
+        )
+        return 0
+    errors = details
+    for src, error in errors:
+        reporter.error(f"{src}: {error}")
+    cancelled = job.cancelled.is_set()
+    actions = dict(sorted(job.progress.actions.items()))
+    reporter.event(
+        'exported',
+        "Export cancelled; run it again to resume." if cancelled else
+        f"Exported {len(games)} games: " + ", ".join(f"{action}: {count}" for action, count in actions.items()),
+        games=len(games), files=len(plan.entries), total_bytes=plan.total_bytes,
+        actions=actions, errors=len(errors), cancelled=cancelled,
+    )
+    return 1 if errors or cancelled else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tag and export ARRM gamelists without the GUI.")
+    parser.add_argument('console_dir', help="console directory containing gamelist.xml")
+    parser.add_argument('--progress', action='append', default=[], metavar='FILE',
+                        help="apply a _progress.txt or _progress.journal file (can be repeated)")
+    parser.add_argument('--rules', metavar='FILE', help="apply tagging rules from a JSON file")
+    parser.add_argument('--overwrite', action='store_true',
+                        help="let the rules retag games that are already tagged")
+    parser.add_argument('--no-save', action='store_true',
+                        help="do not write the tags to the console's progress journal")
+    parser.add_argument('--export', metavar='DIR', help="export the accepted games into DIR")
+    parser.add_argument('--mode', choices=EXPORT_MODES, default='copy', help="how files are transferred")
+    parser.add_argument('--incremental', action='store_true', help="skip files already up to date")
+    parser.add_argument('--verify-hash', action='store_true', help="compare contents instead of dates")
+    parser.add_argument('--workers', type=int, default=4, help="parallel copy workers")
+    parser.add_argument('--dry-run', action='store_true', help="only print what the export would do")
+    parser.add_argument('--json', action='store_true', help="print progress as JSON lines")
+    parser.add_argument('--timings', action='store_true', help="print per-stage latencies at the end")
+    args = parser.parse_args(argv)
+    reporter = Reporter(args.json)
+
+    console_dir = args.console_dir = os.path.abspath(args.console_dir)
+    gamelist_path = os.path.join(console_dir, 'gamelist.xml')
+    if not os.path.exists(gamelist_path):
+        reporter.error(f"No gamelist.xml found in {console_dir}")
+        return 2
+    system_name = os.path.basename(console_dir)
+
+    store = GameStore()
+    try:
+        with TIMINGS.measure('load'):
+            load_games(gamelist_path, store, reporter)
+    except (OSError, SyntaxError) as e:  # ET.ParseError is a SyntaxError
+        reporter.error(f"Could not read {gamelist_path}: {e}")
+        return 1
+    duplicates = find_duplicate_groups(store.games)
+    reporter.event('loaded', f"Loaded {len(store)} games ({len(duplicates.groups)} duplicate groups)",
+                   games=len(store), duplicate_groups=len(duplicates.groups))
+
+    progress = ProgressStore(os.path.join(console_dir, f"{system_name}_progress.journal"), store)
+    try:
+        with TIMINGS.measure('restore progress'):
+            restored = progress.restore()
+        if restored:
+            reporter.event('restored', f"Restored {restored} tags from {progress.journal_path}",
+                           source=progress.journal_path, games=restored)
+
+        def apply(changes):
+            if args.no_save:
+                for game_id, status in changes.items():
+                    store.set_status(game_id, status)
+            else:
+                progress.apply(changes)
+
+        for progress_file in args.progress:
+            with TIMINGS.measure('load progress'):
+                changes = {}
+                for path, status in read_any_progress_file(progress_file):
+                    game_id = store.find_path(path)
+                    if game_id is not None:
+                        changes[game_id] = status
+                apply(changes)
+            reporter.event('imported', f"Applied {len(changes)} tags from {progress_file}",
+                           source=progress_file, games=len(changes))
+
+        if args.rules:
+            with TIMINGS.measure('rules'):
+                rules, overwrite = load_rules(args.rules)
+                plan = plan_auto_tag(rules, store, duplicates, console_dir, overwrite or args.overwrite)
+                apply(plan.changes)
+            reporter.event('rules', f"Rules changed {len(plan)} games", source=args.rules, games=len(plan))
+    except (OSError, ValueError) as e:
+        reporter.error(str(e))
+        return 1
+    finally:
+        progress.close()
+
+    counts = status_counts(store)
+    reporter.event('tagged', ", ".join(f"{name}: {count}" for name, count in counts.items()), counts=counts)
+
+    result = run_export(args, store, reporter) if args.export else 0
+    if args.timings:
+        report_timings(reporter)
+    return result
+
+if __name__ == "__main__":
+    sys.exit(main())
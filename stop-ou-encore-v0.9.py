@@ -1,10 +1,377 @@
 import os
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+import time
+import cProfile
 import tkinter as tk
 from tkinter import filedialog, messagebox, Menu, ttk
-import shutil
+import tkinter.font as tkfont
+import threading
+import queue
+import io
+import sqlite3
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image, ImageTk
+from stop_ou_encore_core import (
+    UNTAGGED, ACCEPTED, REJECTED, HOLD, GameStore, ProgressStore, TextSpool, GamelistLoader,
+    CATALOG_PATH, cache_db_path, Catalog, CatalogLoader, CatalogIngestJob, CatalogWriter, FilterIndex, DuplicateGroups,
+    find_duplicate_groups, FileCacheJob, RomHashJob, load_rules, plan_auto_tag, format_size, ExportOptions,
+    ExportJob, TIMINGS, timed,
+)
+
+# Filter menu entries that select games by status
+FILTER_STATUSES = {
+    "Accepted": ACCEPTED,
+    "Rejected": REJECTED,
+    "On Hold": HOLD,
+    "No Selection": UNTAGGED,
+}
+
+STATUS_COLORS = {
+    ACCEPTED: 'green',
+    REJECTED: 'red',
+    HOLD: 'orange',
+}
+
+THUMBNAIL_SIZE = (300, 300)
+
+def decode_thumbnail(image_path, size=THUMBNAIL_SIZE):
+    image = Image.open(image_path)
+    image.draft('RGB', size)  # Lets JPEG decode at reduced scale
+    image.thumbnail(size)
+    image.load()
+    return image
+
+def encode_thumbnail(image):
+    output = io.BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image.save(output, format='PNG')
+    else:
+        image.convert('RGB').save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+def build_thumbnail_entry(image_path, size=THUMBNAIL_SIZE):
+    # Runs in a worker process during bulk cache generation
+    try:
+        stat = os.stat(image_path)
+        data = encode_thumbnail(decode_thumbnail(image_path, size))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return image_path, None
+    return image_path, (stat.st_size, stat.st_mtime_ns, data)
+
+class ThumbnailCache:
+    # Persistent thumbnails for one console directory, stored as blobs in a
+    # single SQLite file. Entries are keyed by the image path relative to the
+    # console directory plus the thumbnail size, and are only reused while
+    # the source file's size and mtime still match.
+    def __init__(self, db_path, base_dir, size=THUMBNAIL_SIZE):
+        self.base_dir = base_dir
+        self.size = size
+        self.size_key = f"{size[0]}x{size[1]}"
+        self.lock = threading.Lock()
+        self.users = 0
+        self.retired = False
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS thumbnails ("
+                " path TEXT NOT NULL,"
+                " size TEXT NOT NULL,"
+                " file_size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " data BLOB NOT NULL,"
+                " PRIMARY KEY (path, size))"
+            )
+
+    def key(self, image_path):
+        return os.path.relpath(image_path, self.base_dir).replace(os.sep, '/')
+
+    def lookup(self, key, stat):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT data FROM thumbnails WHERE path = ? AND size = ? AND file_size = ? AND mtime_ns = ?",
+                (key, self.size_key, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+        return row[0] if row else None
+
+    def store_many(self, entries):
+        # entries: iterable of (image_path, (file_size, mtime_ns, data))
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO thumbnails (path, size, file_size, mtime_ns, data) VALUES (?, ?, ?, ?, ?)",
+                [(self.key(image_path), self.size_key) + entry for image_path, entry in entries],
+            )
+
+    def get_or_create(self, image_path):
+        stat = os.stat(image_path)
+        key = self.key(image_path)
+        try:
+            data = self.lookup(key, stat)
+        except sqlite3.Error:
+            data = None
+        if data is not None:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+            return image
+        image = decode_thumbnail(image_path, self.size)
+        try:
+            self.store_many([(image_path, (stat.st_size, stat.st_mtime_ns, encode_thumbnail(image)))])
+        except sqlite3.Error:
+            pass  # The thumbnail is still usable for this session
+        return image
+
+    def known(self):
+        with self.lock:
+            return {
+                row[0]: row[1:]
+                for row in self.connection.execute(
+                    "SELECT path, file_size, mtime_ns FROM thumbnails WHERE size = ?", (self.size_key,)
+                )
+            }
+
+    def acquire(self):
+        # Held by decodes and builders so retire() does not close under them
+        with self.lock:
+            self.users += 1
+
+    def release(self):
+        with self.lock:
+            self.users -= 1
+            if self.retired and not self.users:
+                self.connection.close()
+
+    def retire(self):
+        # Closes the connection as soon as the last user has released it
+        with self.lock:
+            self.retired = True
+            if not self.users:
+                self.connection.close()
+
+class ThumbnailCacheBuilder(FileCacheJob):
+    # Pre-generates the thumbnail cache in bulk, decoding on every core
+    def __init__(self, cache, image_paths, workers=None):
+        super().__init__(workers)
+        self.cache = cache
+        self.cache.acquire()  # Released when run() ends
+        self.image_paths = image_paths
+
+    def run(self):
+        try:
+            self.refresh(self.cache, self.image_paths, build_thumbnail_entry, chunksize=16)
+            self.queue.put(('done', self.total, self.total))
+        except (OSError, sqlite3.Error, BrokenProcessPool) as e:
+            self.queue.put(('error', e, 0))
+        finally:
+            self.cache.release()
+
+class ThumbnailLoader:
+    # Decodes artwork on a thread pool so show_game never waits on disk or
+    # PIL. Thumbnails are kept in an LRU cache capped by decoded size, and
+    # finished paths are reported through a queue polled by the Tk thread.
+    def __init__(self, workers=4, max_bytes=64 * 1024 * 1024):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.max_bytes = max_bytes
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.ready = queue.Queue()
+        self.disk_cache = None
+
+    def get(self, image_path):
+        with self.lock:
+            image = self.cache.get(image_path)
+            if image is not None:
+                self.cache.move_to_end(image_path)
+            return image
+
+    def request(self, image_path):
+        with self.lock:
+            if image_path in self.cache or image_path in self.pending:
+                return
+            self.pending.add(image_path)
+        self.executor.submit(self.decode, image_path)
+
+    def decode(self, image_path):
+        with self.lock:
+            disk_cache = self.disk_cache
+            if disk_cache is not None:
+                disk_cache.acquire()
+        try:
+            with TIMINGS.measure('decode image'):
+                if disk_cache is not None:
+                    image = disk_cache.get_or_create(image_path)
+                else:
+                    image = decode_thumbnail(image_path)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            image = False  # Cached as a miss so it is not retried
+        finally:
+            if disk_cache is not None:
+                disk_cache.release()
+        size = 0 if image is False else image.width * image.height * len(image.getbands())
+        with self.lock:
+            self.pending.discard(image_path)
+            self.cache[image_path] = image
+            self.cache_bytes += size
+            while self.cache_bytes > self.max_bytes and len(self.cache) > 1:
+                _, old_image = self.cache.popitem(last=False)
+                if old_image is not False:
+                    self.cache_bytes -= old_image.width * old_image.height * len(old_image.getbands())
+        self.ready.put(image_path)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.cache_bytes = 0
+
+    def set_disk_cache(self, disk_cache):
+        # The old cache closes once decodes still in flight are done with it
+        with self.lock:
+            old_cache, self.disk_cache = self.disk_cache, disk_cache
+        if old_cache is not None and old_cache is not disk_cache:
+            old_cache.retire()
+
+class VirtualListbox(tk.Frame):
+    # Names are kept in a plain Python list and only the rows that fit on
+    # screen are materialized in the underlying tk.Listbox, so rebuilding the
+    # list costs the same for 100 or 100k games.
+    def __init__(self, master, command=None, row_color=None, width=50, **kwargs):
+        super().__init__(master, **kwargs)
+        self.items = []
+        self.top = 0
+        self.visible_rows = 1
+        self.selected = None
+        self.command = command
+        self.row_color = row_color or (lambda row: 'white')
+
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.listbox = tk.Listbox(self, width=width, height=1, exportselection=False, activestyle='none')
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        font = tkfont.Font(font=self.listbox.cget('font'))
+        self.row_height = font.metrics('linespace') + 1 + 2 * int(self.listbox.cget('selectborderwidth'))
+        self.border = int(self.listbox.cget('borderwidth')) + int(self.listbox.cget('highlightthickness'))
+
+        self.listbox.bind("<Configure>", self.on_configure)
+        self.listbox.bind("<<ListboxSelect>>", self.on_listbox_select)
+        self.listbox.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1, 'units', 3))
+        self.listbox.bind("<Button-4>", lambda event: self.scroll(-1, 'units', 3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll(1, 'units', 3))
+        self.listbox.bind("<Up>", lambda event: self.move_selection(-1))
+        self.listbox.bind("<Down>", lambda event: self.move_selection(1))
+        self.listbox.bind("<Prior>", lambda event: self.move_selection(-self.visible_rows))
+        self.listbox.bind("<Next>", lambda event: self.move_selection(self.visible_rows))
+        self.listbox.bind("<Home>", lambda event: self.move_selection(-len(self.items)))
+        self.listbox.bind("<End>", lambda event: self.move_selection(len(self.items)))
+
+    def __len__(self):
+        return len(self.items)
+
+    def set_items(self, items):
+        self.items = items
+        self.top = 0
+        self.selected = None
+        self.render()
+
+    def append_items(self, items):
+        self.items.extend(items)
+        if len(self.items) - len(items) < self.top + self.visible_rows:
+            self.render()
+        else:
+            self.update_scrollbar()
+
+    def select(self, row):
+        # Only a scroll needs a full render; otherwise just the old and new
+        # rows are touched
+        old_top = self.top
+        old_row = self.selected
+        self.selected = row
+        self.see(row)
+        if self.top != old_top:
+            self.render()
+            return
+        self.listbox.select_clear(0, tk.END)
+        if self.top <= row < self.top + self.visible_rows:
+            self.listbox.select_set(row - self.top)
+        self.refresh_rows((old_row, row))
+
+    def see(self, row):
+        if row < self.top:
+            self.top = row
+        elif row >= self.top + self.visible_rows:
+            self.top = row - self.visible_rows + 1
+        self.clamp_top()
+
+    def clamp_top(self):
+        self.top = max(0, min(self.top, len(self.items) - self.visible_rows))
+
+    def render(self):
+        end = min(self.top + self.visible_rows, len(self.items))
+        self.listbox.delete(0, tk.END)
+        if end > self.top:
+            self.listbox.insert(0, *self.items[self.top:end])
+        for row in range(self.top, end):
+            self.listbox.itemconfig(row - self.top, {'bg': self.row_color(row)})
+        if self.selected is not None and self.top <= self.selected < end:
+            self.listbox.select_set(self.selected - self.top)
+        self.update_scrollbar()
+
+    def refresh_rows(self, rows):
+        end = min(self.top + self.visible_rows, len(self.items))
+        for row in rows:
+            if row is not None and self.top <= row < end:
+                self.listbox.itemconfig(row - self.top, {'bg': self.row_color(row)})
+
+    def update_scrollbar(self):
+        if not self.items:
+            self.scrollbar.set(0, 1)
+            return
+        total = len(self.items)
+        self.scrollbar.set(self.top / total, min(self.top + self.visible_rows, total) / total)
+
+    def yview(self, *args):
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.items))
+            self.clamp_top()
+            self.render()
+        elif args[0] == 'scroll':
+            self.scroll(int(args[1]), args[2])
+
+    def scroll(self, amount, what, step=1):
+        if what == 'pages':
+            step = self.visible_rows
+        self.top += amount * step
+        self.clamp_top()
+        self.render()
+        return "break"
+
+    def move_selection(self, delta):
+        if not self.items:
+            return "break"
+        row = 0 if self.selected is None else self.selected
+        row = max(0, min(row + delta, len(self.items) - 1))
+        self.select(row)
+        if self.command:
+            self.command(row)
+        return "break"
+
+    def on_configure(self, event):
+        rows = max(1, (event.height - 2 * self.border) // self.row_height)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.clamp_top()
+            self.render()
+
+    def on_listbox_select(self, event):
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        self.selected = self.top + int(selection[0])
+        if self.command:
+            self.command(self.selected)
 
 class GameApp:
     def __init__(self, root):
@@ -12,19 +379,39 @@ class GameApp:
         self.root.title("Stop ou Encore")
         self.root.geometry("1400x800")  # Adjusted size to fit all elements
 
-        self.accepted_games = []
-        self.rejected_games = []
-        self.hold_games = []
-        self.games = []
+        self.store = GameStore()
+        self.filter_index = FilterIndex(self.store)
         self.filtered_games = []
-        self.duplicates = set()
+        self.duplicates = DuplicateGroups()
         self.current_index = 0
+        self.highlighted_row = None
         self.system_name = ""
         self.filter_mode = "All"
         self.letter_filter = None
+        self.search_text = ""
+        self.search_job = None
+        self.loader = None
+        self.progress = None
+        self.thumbnails = ThumbnailLoader()
+        self.current_image_path = None
+        self.prefetch_count = 8
+        self.thumbnail_cache = None
+        self.hash_job = None
+        self.export_options = ExportOptions()
+        self.catalog = None
+        self.catalog_writer = None
+        self.catalog_system_id = None
+        self.undo_stack = []
+        self.undo_limit = 50
+        self.load_started = None
+        self.timings_overlay = None
+        self.profiler = None
 
         self.setup_ui()
         self.create_menu()
+        self.poll_thumbnails()
+        if os.path.exists(CATALOG_PATH):
+            self.get_catalog()
 
         # Show message on startup
         messagebox.showinfo("Welcome", "Please select a game directory to start")
@@ -36,15 +423,16 @@ class GameApp:
         self.listbox_frame = tk.Frame(self.root)
         self.listbox_frame.grid(row=0, column=1, rowspan=6, sticky="ns")
 
-        self.scrollbar = tk.Scrollbar(self.listbox_frame, orient=tk.VERTICAL)
-        self.listbox = tk.Listbox(self.listbox_frame, width=50, yscrollcommand=self.scrollbar.set)
-        self.scrollbar.config(command=self.listbox.yview)
+        self.search_entry = tk.Entry(self.listbox_frame)
+        self.search_entry.pack(side=tk.TOP, fill=tk.X)
+        self.search_entry.bind("<KeyRelease>", self.on_search_changed)
+        self.search_entry.bind("<Escape>", self.clear_search)
+        self.search_entry.bind("<FocusIn>", self.disable_key_bindings)
+        self.search_entry.bind("<FocusOut>", self.enable_key_bindings)
 
-        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox = VirtualListbox(self.listbox_frame, command=self.on_game_select, row_color=self.row_color, width=50)
         self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-        self.listbox.bind("<<ListboxSelect>>", self.on_game_select)
-
         self.name_label = tk.Label(self.root, text="", font=("Helvetica", 16), wraplength=300)
         self.name_label.grid(row=0, column=2, sticky="w")
 
@@ -94,20 +482,26 @@ class GameApp:
         self.untagged_games_label = tk.Label(self.counter_frame, text="Untagged games: 0", font=("Helvetica", 12))
         self.untagged_games_label.pack()
 
+        self.loading_label = tk.Label(self.counter_frame, text="", font=("Helvetica", 12))
+        self.loading_bar = ttk.Progressbar(self.counter_frame, orient="horizontal", length=200, mode="determinate", maximum=100)
+
         # Key bindings
         self.root.bind('<a>', lambda event: self.accept_game())
         self.root.bind('<r>', lambda event: self.reject_game())
         self.root.bind('<h>', lambda event: self.hold_game())
+        self.root.bind('<Control-z>', lambda event: self.undo())
 
     def disable_key_bindings(self, event):
         self.root.unbind('<a>')
         self.root.unbind('<r>')
         self.root.unbind('<h>')
+        self.root.unbind('<Control-z>')
 
     def enable_key_bindings(self, event):
         self.root.bind('<a>', lambda event: self.accept_game())
         self.root.bind('<r>', lambda event: self.reject_game())
         self.root.bind('<h>', lambda event: self.hold_game())
+        self.root.bind('<Control-z>', lambda event: self.undo())
 
     def add_letter_buttons(self):
         # Add "All" and "0-9" buttons
@@ -126,6 +520,24 @@ class GameApp:
         self.letter_filter = letter
         self.update_listbox()
 
+    def on_search_changed(self, event):
+        # Wait for a short pause in typing before filtering
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(150, self.apply_search)
+
+    def apply_search(self):
+        self.search_job = None
+        text = self.search_entry.get().strip()
+        if text != self.search_text:
+            self.search_text = text
+            self.update_listbox()
+
+    def clear_search(self, event=None):
+        self.search_entry.delete(0, tk.END)
+        self.apply_search()
+        self.listbox.listbox.focus_set()
+
     def create_menu(self):
         menu = Menu(self.root)
         self.root.config(menu=menu)
@@ -137,10 +549,27 @@ class GameApp:
         file_menu.add_command(label="Save Progress", command=self.save_progress)
         file_menu.add_command(label="Load Progress", command=self.load_progress)
         file_menu.add_separator()
+        file_menu.add_command(label="Build Thumbnail Cache", command=self.build_thumbnail_cache)
+        file_menu.add_separator()
         file_menu.add_command(label="Export Accepted Games", command=self.export_games)
+        file_menu.add_command(label="Export Plan (Dry Run)", command=lambda: self.export_games(dry_run=True))
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
 
+        edit_menu = Menu(menu, tearoff=0)
+        menu.add_cascade(label="Edit", menu=edit_menu)
+        edit_menu.add_command(label="Undo", accelerator="Ctrl+Z", command=self.undo)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Auto-Tag with Rules...", command=self.auto_tag)
+
+        catalog_menu = Menu(menu, tearoff=0)
+        menu.add_cascade(label="Catalog", menu=catalog_menu)
+        catalog_menu.add_command(label="Add Systems Folder...", command=self.ingest_systems_folder)
+        catalog_menu.add_command(label="Open System...", command=self.open_catalog_system)
+        catalog_menu.add_separator()
+        catalog_menu.add_command(label="Accepted Games (All Systems)", command=self.show_accepted_report)
+        catalog_menu.add_command(label="Tag Counts per System", command=self.show_status_report)
+
         filter_menu = Menu(menu, tearoff=0)
         menu.add_cascade(label="Filter", menu=filter_menu)
         filter_menu.add_command(label="All", command=lambda: self.set_filter_mode("All"))
@@ -148,6 +577,23 @@ class GameApp:
         filter_menu.add_command(label="Rejected", command=lambda: self.set_filter_mode("Rejected"))
         filter_menu.add_command(label="On Hold", command=lambda: self.set_filter_mode("On Hold"))
         filter_menu.add_command(label="No Selection", command=lambda: self.set_filter_mode("No Selection"))
+        filter_menu.add_command(label="Duplicates", command=lambda: self.set_filter_mode("Duplicates"))
+
+        duplicates_menu = Menu(menu, tearoff=0)
+        menu.add_cascade(label="Duplicates", menu=duplicates_menu)
+        duplicates_menu.add_command(label="Show Duplicate Groups", command=self.show_duplicate_groups)
+        duplicates_menu.add_command(label="Find Identical ROMs (Checksums)", command=self.find_rom_duplicates)
+
+        profiling_menu = Menu(menu, tearoff=0)
+        menu.add_cascade(label="Profiling", menu=profiling_menu)
+        self.overlay_visible = tk.BooleanVar(value=False)
+        self.profiling = tk.BooleanVar(value=False)
+        profiling_menu.add_checkbutton(label="Show Latency Overlay", variable=self.overlay_visible,
+                                       command=self.toggle_overlay)
+        profiling_menu.add_command(label="Reset Latencies", command=TIMINGS.clear)
+        profiling_menu.add_separator()
+        profiling_menu.add_checkbutton(label="Record cProfile Session", variable=self.profiling,
+                                       command=self.toggle_profiling)
 
         about_menu = Menu(menu, tearoff=0)
         menu.add_cascade(label="About", menu=about_menu)
@@ -172,224 +618,602 @@ class GameApp:
             return
 
         self.system_name = os.path.basename(self.console_dir)
+        self.open_thumbnail_cache()
         self.load_gamelist()
 
-    def load_gamelist(self):
-        tree = ET.parse(self.gamelist_path)
-        root = tree.getroot()
+    def open_thumbnail_cache(self):
+        try:
+            self.thumbnail_cache = ThumbnailCache(cache_db_path(self.console_dir), self.console_dir)
+        except (OSError, sqlite3.Error):
+            self.thumbnail_cache = None  # Decode without persisting
+        self.thumbnails.set_disk_cache(self.thumbnail_cache)
+
+    def get_catalog(self):
+        if self.catalog is None:
+            try:
+                self.catalog = Catalog(CATALOG_PATH)
+            except (OSError, sqlite3.Error) as e:
+                messagebox.showerror("Error", f"Could not open the catalog {CATALOG_PATH}:\n{e}")
+                return None
+            # Tag writes go through their own thread and connection
+            self.catalog_writer = CatalogWriter(CATALOG_PATH)
+            self.catalog_writer.start()
+        return self.catalog
+
+    def close_catalog(self):
+        if self.catalog_writer is not None:
+            self.catalog_writer.close()
+
+    def ingest_systems_folder(self):
+        if not self.get_catalog():
+            return
+        root_dir = filedialog.askdirectory(title="Select the folder holding your console directories")
+        if not root_dir:
+            return
+        self.loading_label.config(text="Updating catalog...")
+        self.loading_label.pack()
+        job = CatalogIngestJob(self.catalog.db_path, root_dir)
+        job.start()
+        self.poll_catalog_ingest(job)
+
+    def poll_catalog_ingest(self, job):
+        try:
+            kind, payload = job.queue.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self.poll_catalog_ingest, job)
+            return
+        if self.loader is None:
+            self.loading_label.pack_forget()
+        if kind == 'error':
+            messagebox.showerror("Error", f"Could not update the catalog:\n{payload}")
+            return
+        ingested = sum(1 for _, _, changed in payload if changed)
+        messagebox.showinfo("Catalog", f"{len(payload)} systems found, {ingested} (re)ingested.")
+
+    def open_catalog_system(self):
+        if self.is_loading() or not self.get_catalog():
+            return
+        systems = self.catalog.systems()
+        if not systems:
+            messagebox.showinfo("Catalog", "The catalog is empty. Use Catalog > Add Systems Folder first.")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Open System")
+        listbox = tk.Listbox(dialog, width=50, height=min(len(systems), 25))
+        listbox.pack(padx=10, pady=10)
+        for _, name, _, count in systems:
+            listbox.insert(tk.END, f"{name} ({count} games)")
+
+        def open_selected(event=None):
+            selection = listbox.curselection()
+            if not selection:
+                return
+            console_dir = systems[selection[0]][2]
+            dialog.destroy()
+            if not os.path.exists(os.path.join(console_dir, 'gamelist.xml')):
+                messagebox.showerror("Error", f"No gamelist.xml found in {console_dir}")
+                return
+            self.console_dir = console_dir
+            self.gamelist_path = os.path.join(console_dir, 'gamelist.xml')
+            self.system_name = os.path.basename(console_dir)
+            self.open_thumbnail_cache()
+            self.load_gamelist(from_catalog=True)
+
+        listbox.bind("<Double-Button-1>", open_selected)
+        tk.Button(dialog, text="Open", command=open_selected).pack(pady=(0, 10))
+
+    def show_report(self, title, lines):
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        scrollbar = tk.Scrollbar(window, orient=tk.VERTICAL)
+        text = tk.Text(window, width=100, height=30, wrap=tk.NONE, yscrollcommand=scrollbar.set)
+        scrollbar.config(command=text.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        text.insert(tk.END, "\n".join(lines))
+        text.config(state=tk.DISABLED)
+
+    def show_accepted_report(self):
+        if not self.get_catalog():
+            return
+        rows = self.catalog.games_with_status(ACCEPTED)
+        lines = [f"{system}\t{name}\t{path}" for system, name, path in rows]
+        self.show_report(f"Accepted Games ({len(rows)})", lines)
+
+    def show_status_report(self):
+        if not self.get_catalog():
+            return
+        lines = ["System\tTotal\tAccepted\tRejected\tOn hold\tUntagged"]
+        for row in self.catalog.status_counts():
+            lines.append("\t".join(str(value or 0) for value in row))
+        self.show_report("Tag Counts per System", lines)
+
+    def build_thumbnail_cache(self):
+        if self.is_loading():
+            return
+        if not self.thumbnail_cache:
+            messagebox.showerror("Error", "No thumbnail cache available for this directory!")
+            return
+        image_paths = sorted(set(filter(None, (self.image_path(game) for game in self.store.games))))
+
+        self.cache_window = tk.Toplevel(self.root)
+        self.cache_window.title("Thumbnail Cache")
+        self.cache_window.geometry("500x100")
+
+        self.cache_label = tk.Label(self.cache_window, text="Checking existing thumbnails...")
+        self.cache_label.pack(pady=10)
+
+        self.cache_bar = ttk.Progressbar(self.cache_window, orient="horizontal", length=400, mode="determinate")
+        self.cache_bar.pack(pady=10)
 
-        self.games = []
-        self.accepted_games = []
-        self.rejected_games = []
-        self.hold_games = []
-        self.duplicates = set()
+        builder = ThumbnailCacheBuilder(self.thumbnail_cache, image_paths)
+        self.cache_window.protocol("WM_DELETE_WINDOW", lambda: (builder.cancel(), self.cache_window.destroy()))
+        builder.start()
+        self.poll_cache_builder(builder)
+
+    def poll_cache_builder(self, builder):
+        if builder.cancelled.is_set():
+            return
+        try:
+            while True:
+                kind, done, total = builder.queue.get_nowait()
+                if kind == 'progress':
+                    self.cache_bar["maximum"] = max(total, 1)
+                    self.cache_bar["value"] = done
+                    self.cache_label.config(text=f"Generated {done} of {total} thumbnails")
+                elif kind == 'done':
+                    self.cache_window.destroy()
+                    messagebox.showinfo("Thumbnail Cache", f"{total} thumbnails generated.")
+                    return
+                elif kind == 'error':
+                    self.cache_window.destroy()
+                    messagebox.showerror("Error", f"Could not build the thumbnail cache:\n{done}")
+                    return
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_cache_builder, builder)
+
+    def load_gamelist(self, from_catalog=False):
+        if self.loader is not None:
+            self.loader.cancel()
+        if self.hash_job is not None and self.hash_job.is_alive():
+            # Its checksums are keyed by the IDs of the games being replaced
+            self.hash_job.cancel()
+            self.hash_window.destroy()
+        if self.progress is not None:
+            self.progress.close()
+        # Created up front so tags made while loading are journaled too
+        journal_path = os.path.join(self.console_dir, f"{self.system_name}_progress.journal")
+        self.progress = ProgressStore(journal_path, self.store)
+        self.load_started = time.perf_counter()
+
+        self.catalog_system_id = None
+        self.undo_stack = []
+        self.store.clear()
+        self.filter_index.clear()
+        self.thumbnails.clear()
+        self.duplicates = DuplicateGroups()
         self.current_index = 0
-        self.listbox.delete(0, tk.END)
+        self.highlighted_row = None
+        self.filtered_games = []
+        self.listbox.set_items([])
+        self.update_counters()
 
-        for game in root.findall('game'):
-            game_data = {}
-            for elem in game:
-                game_data[elem.tag] = elem.text
-            self.games.append(game_data)
+        self.loading_label.config(text="Loading gamelist...")
+        self.loading_label.pack()
+        self.loading_bar["value"] = 0
+        self.loading_bar.pack(pady=5)
 
-        self.find_duplicates()
-        self.update_listbox()
+        # The previous spool (or catalog pages) is released once its records
+        # and loader are gone
+        if from_catalog:
+            self.loader = CatalogLoader(self.catalog.db_path, self.console_dir)
+        else:
+            self.loader = GamelistLoader(self.gamelist_path, TextSpool())
+        self.loader.start()
+        self.poll_loader(self.loader)
+
+    def is_loading(self):
+        if self.loader is not None:
+            messagebox.showinfo("Please wait", "The gamelist is still loading.")
+            return True
+        return False
+
+    def poll_loader(self, loader):
+        if loader is not self.loader:
+            return  # A newer load replaced this one
+        status_filter = FILTER_STATUSES.get(self.filter_mode)
+        try:
+            while True:
+                kind, payload, bytes_read, total = loader.queue.get_nowait()
+                if kind == 'games':
+                    self.add_loaded_games(payload, status_filter)
+                    if total:
+                        self.loading_bar["value"] = 100 * bytes_read / total
+                elif kind == 'done':
+                    self.finish_loading(payload)
+                    return
+                elif kind == 'error':
+                    # The journal is not replayed against a partial gamelist
+                    self.finish_loading(restore=False)
+                    messagebox.showerror("Error", f"Could not read {self.gamelist_path}:\n{payload}")
+                    return
+        except queue.Empty:
+            pass
+        self.loading_label.config(text=f"Loading gamelist... {len(self.store)} games")
         self.update_counters()
-        self.show_game(0)  # Ensure the first game is shown correctly
-
-    def find_duplicates(self):
-        seen = {}
-        self.duplicates = set()
-        for game in self.games:
-            if game['name'] in seen:
-                self.duplicates.add(game['name'])
-                self.duplicates.add(seen[game['name']])
-            else:
-                seen[game['name']] = game['name']
+        self.root.after(50, self.poll_loader, loader)
+
+    def add_loaded_games(self, batch, status_filter):
+        new_rows = []
+        for game in batch:
+            game_id = self.store.add(game)
+            self.filter_index.add(game_id, game.name)
+            # Duplicates are only known once the whole gamelist is read
+            if self.filter_mode != "Duplicates" and \
+                    self.filter_index.matches(game_id, self.letter_filter, status_filter, self.search_text):
+                self.filtered_games.append(game_id)
+                new_rows.append(game.name)
+        if not new_rows:
+            return
+        first_rows = not self.listbox.items
+        self.listbox.append_items(new_rows)
+        if first_rows:
+            self.show_game(0)
+
+    def finish_loading(self, duplicates=None, restore=True):
+        self.loader = None
+        TIMINGS.add('load', time.perf_counter() - self.load_started)
+        self.loading_label.pack_forget()
+        self.loading_bar.pack_forget()
+        if duplicates is None:
+            duplicates = find_duplicate_groups(self.store.games)
+        self.duplicates = duplicates
+        if restore:
+            self.restore_progress()
+        self.update_counters()
+
+    @timed('restore progress')
+    def restore_progress(self):
+        restored = 0
+        if self.catalog is not None:
+            # Tags from the catalog first; the journal has the final word
+            self.catalog_system_id = self.catalog.system_id(self.console_dir)
+            if self.catalog_system_id is not None:
+                catalog_statuses = self.catalog.statuses(self.catalog_system_id)
+                for path, status in catalog_statuses.items():
+                    game_id = self.store.find_path(path)
+                    if game_id is not None:
+                        self.store.set_status(game_id, status)
+                        restored += 1
+        try:
+            restored += self.progress.restore()
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not restore progress from {self.progress.journal_path}:\n{e}")
+            return
+        if self.catalog_system_id is not None:
+            # Resync whatever an earlier session failed to write
+            games = self.store.games
+            self.catalog_writer.set_statuses(self.catalog_system_id, [
+                (games[game_id]['path'], status) for game_id, status in enumerate(self.store.status)
+                if catalog_statuses.get(games[game_id]['path'], UNTAGGED) != status
+            ])
+        if restored or self.filter_mode == "Duplicates":
+            self.update_listbox()
+        else:
+            self.listbox.render()
+
+    def find_rom_duplicates(self):
+        if self.is_loading() or not self.store.games:
+            return
+        job = self.hash_job = RomHashJob(cache_db_path(self.console_dir), self.console_dir, self.store.games)
+
+        self.hash_window = tk.Toplevel(self.root)
+        self.hash_window.title("ROM Hashes")
+        self.hash_window.geometry("500x100")
+        self.hash_label = tk.Label(self.hash_window, text="Checking cached checksums...")
+        self.hash_label.pack(pady=10)
+        self.hash_bar = ttk.Progressbar(self.hash_window, orient="horizontal", length=400, mode="determinate")
+        self.hash_bar.pack(pady=10)
+        self.hash_window.protocol("WM_DELETE_WINDOW", lambda: (job.cancel(), self.hash_window.destroy()))
+
+        job.start()
+        self.poll_rom_hashes(job)
+
+    def poll_rom_hashes(self, job):
+        if job.cancelled.is_set():
+            return
+        try:
+            while True:
+                message = job.queue.get_nowait()
+                if message[0] == 'progress':
+                    _, done, total = message
+                    self.hash_bar["maximum"] = max(total, 1)
+                    self.hash_bar["value"] = done
+                    self.hash_label.config(text=f"Hashed {done} of {total} ROMs")
+                    continue
+                self.hash_window.destroy()
+                if message[0] == 'error':
+                    messagebox.showerror("Error", f"Could not hash the ROMs:\n{message[1]}")
+                    return
+                if self.store.games is not job.games:
+                    return  # another gamelist was loaded meanwhile
+                self.duplicates = find_duplicate_groups(self.store.games, message[1])
+                self.update_listbox()
+                messagebox.showinfo("Duplicates", f"{len(self.duplicates)} duplicate groups found "
+                                    "using titles and ROM checksums.")
+                return
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_rom_hashes, job)
+
+    def show_duplicate_groups(self):
+        if not self.duplicates:
+            messagebox.showinfo("Duplicates", "No duplicate games found.")
+            return
+        games = self.store.games
+        window = tk.Toplevel(self.root)
+        window.title(f"Duplicate Groups ({len(self.duplicates)})")
+
+        groups_list = VirtualListbox(window, width=50)
+        groups_list.grid(row=0, column=0, sticky="ns", padx=5, pady=5)
+        groups_list.set_items([f"{games[group[0]].name} ({len(group)})" for group in self.duplicates.groups])
+
+        members_list = tk.Listbox(window, width=60, height=15, selectmode=tk.EXTENDED, exportselection=False)
+        members_list.grid(row=0, column=1, sticky="ns", padx=5, pady=5)
+        shown = []
+
+        def show_members(index):
+            shown[:] = self.duplicates.groups[index]
+            members_list.delete(0, tk.END)
+            for game_id in shown:
+                members_list.insert(tk.END, games[game_id].name)
+                members_list.itemconfig(tk.END, {'bg': self.game_color(game_id)})
+
+        def tag_group(status, keep_selected=False):
+            if not shown:
+                return
+            selected = {shown[i] for i in members_list.curselection()}
+            if keep_selected and not selected:
+                return
+            # One batch, so a single undo reverts the whole group
+            changes = {game_id: status for game_id in shown}
+            if keep_selected:
+                changes.update((game_id, ACCEPTED) for game_id in selected)
+            self.apply_changes(changes)
+            show_members(groups_list.selected)
+
+        groups_list.command = show_members
+        button_frame = tk.Frame(window)
+        button_frame.grid(row=1, column=0, columnspan=2, pady=5)
+        tk.Button(button_frame, text="Accept Selected, Reject Others",
+                  command=lambda: tag_group(REJECTED, keep_selected=True)).grid(row=0, column=0, padx=5)
+        tk.Button(button_frame, text="Accept All", command=lambda: tag_group(ACCEPTED), bg="green").grid(row=0, column=1, padx=5)
+        tk.Button(button_frame, text="Reject All", command=lambda: tag_group(REJECTED), bg="red").grid(row=0, column=2, padx=5)
+        tk.Button(button_frame, text="Hold All", command=lambda: tag_group(HOLD), bg="orange").grid(row=0, column=3, padx=5)
 
     def load_progress(self):
+        # Imports the plain-text progress file; the tags also go to the journal
+        if self.is_loading() or self.progress is None:
+            return
         progress_file = os.path.join(self.console_dir, f"{self.system_name}_progress.txt")
         if os.path.exists(progress_file):
-            with open(progress_file, 'r') as file:
-                lines = file.readlines()
-                section = None
-                for line in lines:
-                    line = line.strip()
-                    if line == "Accepted:":
-                        section = "accepted"
-                    elif line == "Rejected:":
-                        section = "rejected"
-                    elif line == "On Hold:":
-                        section = "hold"
-                    elif section == "accepted":
-                        for game in self.games:
-                            if game['path'] == line:
-                                self.accepted_games.append(game)
-                                break
-                    elif section == "rejected":
-                        for game in self.games:
-                            if game['path'] == line:
-                                self.rejected_games.append(game)
-                                break
-                    elif section == "hold":
-                        for game in self.games:
-                            if game['path'] == line:
-                                self.hold_games.append(game)
-                                break
+            with TIMINGS.measure('load progress'):
+                self.progress.import_legacy(progress_file)
         self.update_listbox()
         self.update_counters()
 
     def save_progress(self):
+        # Tags are journaled as they happen; this writes the plain-text format
+        if self.is_loading() or self.progress is None:
+            return
         progress_file = os.path.join(self.console_dir, f"{self.system_name}_progress.txt")
         if os.path.exists(progress_file):
             result = messagebox.askyesno("Warning", "Progress file already exists. Do you want to overwrite it?")
             if not result:
                 return
 
-        with open(progress_file, 'w') as file:
-            file.write("Accepted:\n")
-            for game in self.accepted_games:
-                file.write(f"{game['path']}\n")
-            file.write("\nRejected:\n")
-            for game in self.rejected_games:
-                file.write(f"{game['path']}\n")
-            file.write("\nOn Hold:\n")
-            for game in self.hold_games:
-                file.write(f"{game['path']}\n")
-
-    def on_game_select(self, event):
-        w = event.widget
-        if w.curselection():
-            index = int(w.curselection()[0])
-            self.current_index = index
-            self.show_game(index)
+        with TIMINGS.measure('save progress'):
+            self.progress.export_legacy(progress_file)
+
+    def on_game_select(self, index):
+        self.current_index = index
+        self.show_game(index)
 
+    @timed('show game')
     def show_game(self, index):
         if index < 0 or index >= len(self.filtered_games):
             return
 
-        game = self.filtered_games[index]
+        game = self.store.games[self.filtered_games[index]]
         self.name_label.config(text=f"Name: {game['name']}")
         self.filename_label.config(text=f"Filename: {game['path']}")
         self.region_label.config(text=f"Region: {game.get('region', 'Unknown')}")
         self.desc_text.delete(1.0, tk.END)
         self.desc_text.insert(tk.END, game.get('desc', 'No description available'))
 
-        if game.get('image') and os.path.exists(os.path.join(self.console_dir, game['image'])):
-            image_path = os.path.join(self.console_dir, game['image'])
-            image = Image.open(image_path)
-            image.thumbnail((300, 300))  # Increased image size
-            photo = ImageTk.PhotoImage(image)
-            self.image_label.configure(image=photo)
-            self.image_label.image = photo
-        else:
-            self.image_label.configure(image=None)
+        self.current_image_path = self.image_path(game)
+        image = self.thumbnails.get(self.current_image_path) if self.current_image_path else None
+        if image is not None:
+            self.set_image(image)
+        elif self.current_image_path:
+            self.image_label.configure(image='', text="Loading image...")
             self.image_label.image = None
+            self.thumbnails.request(self.current_image_path)
+        else:
+            self.set_image(False)
 
-        self.update_listbox_colors()
+        self.move_highlight(index)
+        self.prefetch_images(index)
 
-    def accept_game(self):
-        if not self.filtered_games:
+    def image_path(self, game):
+        if not game.get('image'):
+            return None
+        return os.path.join(self.console_dir, game['image'])
+
+    def set_image(self, image):
+        if image is False:
+            self.image_label.configure(image='', text="")
+            self.image_label.image = None
             return
-        game = self.filtered_games[self.current_index]
-        if game not in self.accepted_games:
-            self.accepted_games.append(game)
-        if game in self.rejected_games:
-            self.rejected_games.remove(game)
-        if game in self.hold_games:
-            self.hold_games.remove(game)
-        self.update_listbox_colors()
-        self.update_counters()
-        self.next_game()
+        photo = ImageTk.PhotoImage(image)
+        self.image_label.configure(image=photo, text="")
+        self.image_label.image = photo
+
+    def prefetch_images(self, index):
+        games = self.store.games
+        for row in range(index + 1, min(index + 1 + self.prefetch_count, len(self.filtered_games))):
+            image_path = self.image_path(games[self.filtered_games[row]])
+            if image_path:
+                self.thumbnails.request(image_path)
+
+    def poll_thumbnails(self):
+        try:
+            while True:
+                image_path = self.thumbnails.ready.get_nowait()
+                image = self.thumbnails.get(image_path)
+                if image_path == self.current_image_path and image is not None:
+                    self.set_image(image)
+        except queue.Empty:
+            pass
+        self.root.after(30, self.poll_thumbnails)
+
+    def accept_game(self):
+        self.tag_game(ACCEPTED)
 
     def reject_game(self):
-        if not self.filtered_games:
-            return
-        game = self.filtered_games[self.current_index]
-        if game not in self.rejected_games:
-            self.rejected_games.append(game)
-        if game in self.accepted_games:
-            self.accepted_games.remove(game)
-        if game in self.hold_games:
-            self.hold_games.remove(game)
-        self.update_listbox_colors()
-        self.update_counters()
-        self.next_game()
+        self.tag_game(REJECTED)
 
     def hold_game(self):
+        self.tag_game(HOLD)
+
+    @timed('tag')
+    def tag_game(self, status):
         if not self.filtered_games:
             return
-        game = self.filtered_games[self.current_index]
-        if game not in self.hold_games:
-            self.hold_games.append(game)
-        if game in self.accepted_games:
-            self.accepted_games.remove(game)
-        if game in self.rejected_games:
-            self.rejected_games.remove(game)
-        self.update_listbox_colors()
+        game_id = self.filtered_games[self.current_index]
+        old_status = self.store.set_status(game_id, status)
+        if old_status != status:
+            self.progress.record(game_id)
+            if self.catalog_system_id is not None:
+                self.catalog_writer.set_statuses(self.catalog_system_id, [(self.store.games[game_id]['path'], status)])
+            self.push_undo([(game_id, old_status)])
         self.update_counters()
         self.next_game()
 
+    @timed('tag batch')
+    def apply_changes(self, changes, undoable=True):
+        # Batch tagging from {game_id: status}: one journal write, one catalog
+        # transaction and one repaint for the whole batch
+        undo = self.progress.apply(changes)
+        if not undo:
+            return undo
+        changed = [game_id for game_id, _ in undo]
+        if self.catalog_system_id is not None:
+            games = self.store.games
+            self.catalog_writer.set_statuses(
+                self.catalog_system_id, [(games[game_id]['path'], self.store.status[game_id]) for game_id in changed]
+            )
+        if undoable:
+            self.push_undo(undo)
+        self.listbox.render()
+        self.update_counters()
+        return undo
+
+    def push_undo(self, undo):
+        self.undo_stack.append(undo)
+        del self.undo_stack[:-self.undo_limit]
+
+    def undo(self):
+        if not self.undo_stack:
+            return
+        self.apply_changes(dict(self.undo_stack.pop()), undoable=False)
+
+    def auto_tag(self):
+        if self.is_loading() or not self.store.games:
+            return
+        rules_path = filedialog.askopenfilename(
+            title="Select Tagging Rules", initialdir=self.console_dir, filetypes=[("JSON rules", "*.json")]
+        )
+        if not rules_path:
+            return
+        try:
+            rules, overwrite = load_rules(rules_path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not read the rules:\n{e}")
+            return
+
+        plan = plan_auto_tag(rules, self.store, self.duplicates, self.console_dir, overwrite)
+        if not plan:
+            messagebox.showinfo("Auto-Tag", "The rules do not change any game.")
+            return
+        counts = plan.resulting_counts()
+        summary = "\n".join(
+            f"{label}: {self.store.count(status)} -> {counts[status]}"
+            for label, status in (("Accepted", ACCEPTED), ("Rejected", REJECTED),
+                                  ("On hold", HOLD), ("Untagged", UNTAGGED))
+        )
+        if messagebox.askyesno("Auto-Tag", f"{len(plan)} games would change.\n\n{summary}\n\nApply these changes?"):
+            self.apply_changes(plan.changes)
+
     def next_game(self):
         if self.current_index < len(self.filtered_games) - 1:
-            self.current_index += 1
-            self.listbox.select_clear(0, tk.END)
-            self.listbox.select_set(self.current_index)
-            self.listbox.event_generate("<<ListboxSelect>>")
+            self.select_row(self.current_index + 1)
 
+    def select_row(self, index):
+        self.current_index = index
+        self.listbox.select(index)
+        self.show_game(index)
+
+    @timed('filter')
     def update_listbox(self):
-        self.filtered_games = []
-        self.listbox.delete(0, tk.END)
-        for game in self.games:
-            if self.letter_filter == "0-9" and not game['name'][0].isdigit():
-                continue
-            if self.letter_filter and self.letter_filter != "0-9" and not game['name'].startswith(self.letter_filter):
-                continue
-            if self.filter_mode == "All":
-                self.filtered_games.append(game)
-                self.listbox.insert(tk.END, game['name'])
-            elif self.filter_mode == "Accepted" and game in self.accepted_games:
-                self.filtered_games.append(game)
-                self.listbox.insert(tk.END, game['name'])
-            elif self.filter_mode == "Rejected" and game in self.rejected_games:
-                self.filtered_games.append(game)
-                self.listbox.insert(tk.END, game['name'])
-            elif self.filter_mode == "On Hold" and game in self.hold_games:
-                self.filtered_games.append(game)
-                self.listbox.insert(tk.END, game['name'])
-            elif self.filter_mode == "No Selection" and game not in self.accepted_games and game not in self.rejected_games and game not in self.hold_games:
-                self.filtered_games.append(game)
-                self.listbox.insert(tk.END, game['name'])
-        self.update_listbox_colors()
-
-    def update_listbox_colors(self):
-        for i, game in enumerate(self.filtered_games):
-            bg = 'white'
-            if game['name'] in self.duplicates:
-                if game in self.accepted_games:
-                    bg = 'green'
-                elif game in self.rejected_games:
-                    bg = 'red'
-                elif game in self.hold_games:
-                    bg = 'orange'
-                else:
-                    bg = 'pink'
-            elif game in self.accepted_games:
-                bg = 'green'
-            elif game in self.rejected_games:
-                bg = 'red'
-            elif game in self.hold_games:
-                bg = 'orange'
-            if i == self.current_index:
-                bg = 'yellow'
-            self.listbox.itemconfig(i, {'bg': bg})
+        status_filter = FILTER_STATUSES.get(self.filter_mode)
+        subset = self.duplicates.ids() if self.filter_mode == "Duplicates" else None
+        shown_game = self.filtered_games[self.current_index] if self.current_index < len(self.filtered_games) else None
+        self.filtered_games = self.filter_index.query(self.letter_filter, status_filter, self.search_text, subset)
+        games = self.store.games
+        names = [games[game_id].name for game_id in self.filtered_games]
+        # Stay on the game in the detail pane if it is still listed, otherwise
+        # start from the top, so tagging always acts on the game being shown
+        row = bisect_left(self.filtered_games, shown_game) if shown_game is not None else 0
+        if row >= len(self.filtered_games) or self.filtered_games[row] != shown_game:
+            row = 0
+        self.current_index = row
+        self.highlighted_row = None
+        self.listbox.set_items(names)
+        if self.filtered_games:
+            self.listbox.select(row)
+            self.show_game(row)
+
+    def game_color(self, game_id):
+        status = self.store.status[game_id]
+        if status != UNTAGGED:
+            return STATUS_COLORS[status]
+        if game_id in self.duplicates:
+            return 'pink'
+        return 'white'
+
+    def row_color(self, row):
+        if row == self.highlighted_row:
+            return 'yellow'
+        return self.game_color(self.filtered_games[row])
+
+    def refresh_rows(self, *rows):
+        # Dirty-row repaint used by tag actions and selection changes
+        self.listbox.refresh_rows(rows)
+
+    def move_highlight(self, row):
+        old_row = self.highlighted_row
+        self.highlighted_row = row
+        self.refresh_rows(old_row, row)
 
     def update_counters(self):
-        total_games = len(self.games)
-        accepted_games = len(self.accepted_games)
-        rejected_games = len(self.rejected_games)
-        hold_games = len(self.hold_games)
-        untagged_games = total_games - accepted_games - rejected_games - hold_games
+        total_games = len(self.store)
+        accepted_games = self.store.count(ACCEPTED)
+        rejected_games = self.store.count(REJECTED)
+        hold_games = self.store.count(HOLD)
+        untagged_games = self.store.count(UNTAGGED)
 
         self.total_games_label.config(text=f"Total games: {total_games}")
         self.accepted_games_label.config(text=f"Accepted games: {accepted_games}")
@@ -397,8 +1221,53 @@ class GameApp:
         self.hold_games_label.config(text=f"On hold games: {hold_games}")
         self.untagged_games_label.config(text=f"Untagged games: {untagged_games}")
 
-    def export_games(self):
-        if not self.accepted_games:
+    def toggle_overlay(self):
+        if self.overlay_visible.get():
+            self.timings_overlay = tk.Label(self.root, justify="left", anchor="nw", font=("Courier", 9),
+                                            bg="black", fg="lime")
+            self.timings_overlay.place(relx=1.0, y=0, anchor="ne")
+            self.update_overlay(self.timings_overlay)
+        elif self.timings_overlay is not None:
+            self.timings_overlay.destroy()
+            self.timings_overlay = None
+
+    def update_overlay(self, overlay):
+        if overlay is not self.timings_overlay:
+            return  # Hidden, or replaced by a newer overlay
+        lines = [f"{'operation':<17}{'count':>6}{'last':>9}{'p50':>9}{'p90':>9}{'p99':>9}"]
+        for name, stats in TIMINGS.summary().items():
+            lines.append(f"{name:<17}{stats['count']:>6}" + "".join(
+                f"{stats[key] * 1000:>7.1f}ms" for key in ('last', 'p50', 'p90', 'p99')
+            ))
+        overlay.config(text="\n".join(lines))
+        overlay.lift()
+        self.root.after(500, self.update_overlay, overlay)
+
+    def toggle_profiling(self):
+        # cProfile only sees the Tk thread; loader, thumbnail and export
+        # workers show up in the latency overlay instead
+        if self.profiling.get():
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            return
+        profiler, self.profiler = self.profiler, None
+        if profiler is None:
+            return
+        profiler.disable()
+        profile_path = filedialog.asksaveasfilename(
+            title="Save Profile", defaultextension=".prof", filetypes=[("cProfile stats", "*.prof")],
+            initialfile=time.strftime("stop-ou-encore-%Y%m%d-%H%M%S.prof"),
+        )
+        if profile_path:
+            profiler.dump_stats(profile_path)
+            messagebox.showinfo("Profile Saved", f"Saved to {profile_path}.\n"
+                                "Open it with: python -m pstats " + os.path.basename(profile_path))
+
+    def export_games(self, dry_run=False):
+        if self.is_loading():
+            return
+        accepted_ids = self.store.ids_with_status(ACCEPTED)
+        if not accepted_ids:
             messagebox.showerror("Error", "No accepted games to export!")
             return
 
@@ -407,61 +1276,105 @@ class GameApp:
             messagebox.showerror("Error", "No directory selected!")
             return
 
+        options = self.ask_export_options(dry_run)
+        if options is None:
+            return
+
         # Create the export progress window
         self.progress_window = tk.Toplevel(self.root)
         self.progress_window.title("Export Progress")
         self.progress_window.geometry("500x100")
 
-        self.progress_label = tk.Label(self.progress_window, text="Starting export...")
+        self.progress_label = tk.Label(self.progress_window, text="Planning export...")
         self.progress_label.pack(pady=10)
 
         self.progress_bar = ttk.Progressbar(self.progress_window, orient="horizontal", length=400, mode="determinate")
         self.progress_bar.pack(pady=10)
-        self.progress_bar["maximum"] = len(self.accepted_games)
+        self.progress_bar["maximum"] = 100
         self.progress_bar["value"] = 0
 
-        export_gamelist_path = os.path.join(export_dir, 'gamelist.xml')
-        root = ET.Element('gameList')
-
-        for i, game in enumerate(self.accepted_games):
-            game_element = ET.SubElement(root, 'game')
-            for key, value in game.items():
-                ET.SubElement(game_element, key).text = value
-
-                # Copy game files and images
-                game_path = os.path.join(self.console_dir, game['path'])
-                if key in ['image', 'video', 'marquee', 'thumbnail', 'manual', 'rating', 'fanart', 'boxart']:
-                    file_path = os.path.join(self.console_dir, value)
-                    if os.path.exists(file_path):
-                        self.progress_label.config(text=f"Copying: {value}")
-                        self.progress_bar.update()
-                        self.copy_file(file_path, export_dir)
-                elif os.path.exists(game_path):
-                    self.progress_label.config(text=f"Copying: {game['path']}")
-                    self.progress_bar.update()
-                    self.copy_file(game_path, export_dir)
-
-            self.progress_bar["value"] += 1
-            self.progress_bar.update()
-
-        xml_str = ET.tostring(root, encoding='utf-8')
-        parsed_str = minidom.parseString(xml_str)
-        pretty_str = parsed_str.toprettyxml(indent="  ")
-
-        with open(export_gamelist_path, 'w', encoding='utf-8') as f:
-            f.write(pretty_str)
-
-        self.progress_label.config(text="Export Complete")
-        messagebox.showinfo("Export Complete", "Accepted games have been exported successfully!")
-        self.progress_window.destroy()
+        games = [self.store.games[game_id] for game_id in accepted_ids]
+        job = ExportJob(games, self.console_dir, export_dir, options, dry_run=dry_run)
+        self.progress_window.protocol("WM_DELETE_WINDOW", job.cancel)
+        job.start()
+        self.poll_export(job)
+
+    def ask_export_options(self, dry_run):
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Export Options")
+        dialog.transient(self.root)
+        dialog.grab_set()
+
+        mode = tk.StringVar(value=self.export_options.mode)
+        incremental = tk.BooleanVar(value=self.export_options.incremental)
+        verify_hash = tk.BooleanVar(value=self.export_options.verify_hash)
+
+        tk.Label(dialog, text="Transfer mode:").pack(anchor="w", padx=10, pady=(10, 0))
+        for value, label in (
+            ('copy', "Copy files"),
+            ('hardlink', "Hard link (same filesystem only)"),
+            ('reflink', "Reflink / copy-on-write clone"),
+            ('symlink', "Symbolic link"),
+        ):
+            tk.Radiobutton(dialog, text=label, variable=mode, value=value).pack(anchor="w", padx=20)
+        tk.Checkbutton(dialog, text="Skip files already up to date (same size and date)",
+                       variable=incremental).pack(anchor="w", padx=10, pady=(10, 0))
+        tk.Checkbutton(dialog, text="Compare file contents instead of dates (slower)",
+                       variable=verify_hash).pack(anchor="w", padx=10)
+
+        result = []
+
+        def confirm():
+            result.append(ExportOptions(mode.get(), incremental.get(), verify_hash.get(), self.export_options.workers))
+            dialog.destroy()
+
+        button_frame = tk.Frame(dialog)
+        button_frame.pack(pady=10)
+        tk.Button(button_frame, text="Dry Run" if dry_run else "Export", command=confirm).grid(row=0, column=0, padx=5)
+        tk.Button(button_frame, text="Cancel", command=dialog.destroy).grid(row=0, column=1, padx=5)
+
+        self.root.wait_window(dialog)
+        if not result:
+            return None
+        self.export_options = result[0]
+        return self.export_options
+
+    def poll_export(self, job):
+        try:
+            kind, payload = job.queue.get_nowait()
+        except queue.Empty:
+            bytes_done, total_bytes, files_done, total_files, current = job.progress.snapshot()
+            if total_files:
+                self.progress_bar["value"] = 100 * bytes_done / max(total_bytes, 1)
+                self.progress_label.config(
+                    text=f"Copying {files_done}/{total_files} files, {format_size(bytes_done)} of {format_size(total_bytes)}"
+                )
+            self.root.after(100, self.poll_export, job)
+            return
 
-    def copy_file(self, src, dest_dir):
-        rel_path = os.path.relpath(src, self.console_dir)
-        dest_path = os.path.join(dest_dir, rel_path)
-        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-        shutil.copy(src, dest_path)
+        self.progress_window.destroy()
+        if kind == 'error':
+            messagebox.showerror("Error", f"Export failed:\n{payload}")
+            return
+        plan, details = payload
+        if kind == 'planned':
+            lines = list(plan.describe(details))
+            # The summary is the last line; show it above the file list
+            self.show_report("Export Plan (Dry Run)", lines[-1:] + [""] + lines[:-1])
+            return
+        errors = details
+        counts = ", ".join(f"{action}: {count}" for action, count in sorted(job.progress.actions.items()))
+        if job.cancelled.is_set():
+            messagebox.showinfo("Export Cancelled", "The export was cancelled. Run it again into the same "
+                                "directory to resume where it stopped.")
+        elif errors:
+            messagebox.showerror("Export Complete", f"Export finished, but {len(errors)} files could not be copied:\n"
+                                 + "\n".join(f"{src}: {error}" for src, error in errors[:10]))
+        else:
+            messagebox.showinfo("Export Complete", f"Accepted games have been exported successfully!\n{counts}")
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = GameApp(root)
     root.mainloop()
+    app.close_catalog()
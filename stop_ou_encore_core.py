@@ -0,0 +1,1622 @@
+# Game store, gamelist loading, progress, catalog, duplicates, rules and export.
+# Nothing in here imports Tk or PIL so it can be used without a display
+# (see stop-ou-encore-cli.py).
+import os
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+import shutil
+import threading
+import queue
+import time
+import sqlite3
+import hashlib
+import json
+import re
+import unicodedata
+import zlib
+import functools
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+UNTAGGED = 0
+ACCEPTED = 1
+REJECTED = 2
+HOLD = 3
+
+class Timings:
+    # Recent latencies per operation, filled by the UI thread and the worker
+    # threads alike. Only the last `keep` samples of each are kept, so the
+    # percentiles follow what the curator is doing right now.
+    def __init__(self, keep=500):
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.counts = {}
+
+    def add(self, name, seconds):
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.keep)
+            samples.append(seconds)
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    @contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+            self.counts.clear()
+
+    def summary(self):
+        # {name: {'count', 'last', 'p50', 'p90', 'p99', 'max'}} in seconds
+        with self.lock:
+            snapshot = {name: (list(samples), self.counts[name]) for name, samples in self.samples.items()}
+        result = {}
+        for name, (samples, count) in sorted(snapshot.items()):
+            ordered = sorted(samples)
+            result[name] = {'count': count, 'last': samples[-1], 'max': ordered[-1]}
+            for percent in (50, 90, 99):
+                result[name][f'p{percent}'] = ordered[min(len(ordered) - 1, len(ordered) * percent // 100)]
+        return result
+
+# Shared by the whole process; see timed() and the Profiling menu
+TIMINGS = Timings()
+
+def timed(name):
+    # Method decorator that records each call's duration in TIMINGS
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with TIMINGS.measure(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+class GameStore:
+    # Games are addressed by stable integer IDs (their position in self.games).
+    # Each game's status lives in a bytearray and every status keeps an index
+    # set, so membership tests, retagging and counts are all O(1).
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.games = []
+        self.status = bytearray()
+        self.by_status = {UNTAGGED: set(), ACCEPTED: set(), REJECTED: set(), HOLD: set()}
+        self.by_path = {}
+
+    def __len__(self):
+        return len(self.games)
+
+    def add(self, game):
+        game_id = len(self.games)
+        self.games.append(game)
+        self.status.append(UNTAGGED)
+        self.by_status[UNTAGGED].add(game_id)
+        self.by_path.setdefault(game.get('path'), game_id)
+        return game_id
+
+    def find_path(self, path):
+        return self.by_path.get(path)
+
+    def set_status(self, game_id, status):
+        old_status = self.status[game_id]
+        if old_status != status:
+            self.by_status[old_status].discard(game_id)
+            self.by_status[status].add(game_id)
+            self.status[game_id] = status
+        return old_status
+
+    def count(self, status):
+        return len(self.by_status[status])
+
+    def ids_with_status(self, status):
+        # Sorted so that saved progress and exports follow the gamelist order
+        return sorted(self.by_status[status])
+
+STATUS_CODES = {UNTAGGED: 'U', ACCEPTED: 'A', REJECTED: 'R', HOLD: 'H'}
+CODE_STATUSES = {code: status for status, code in STATUS_CODES.items()}
+# Section headers of the original <system>_progress.txt format
+PROGRESS_SECTIONS = (("Accepted:", ACCEPTED), ("Rejected:", REJECTED), ("On Hold:", HOLD))
+
+def read_progress_file(progress_file):
+    # Yields (path, status) pairs from a legacy _progress.txt file
+    headers = dict(PROGRESS_SECTIONS)
+    section = None
+    with open(progress_file, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line in headers:
+                section = headers[line]
+            elif section is not None and line:
+                yield line, section
+
+def read_journal_file(journal_path):
+    # Yields (path, status) pairs from a _progress.journal file, oldest first
+    with open(journal_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            code, _, path = line.rstrip("\n").partition("\t")
+            if code in CODE_STATUSES and path:
+                yield path, CODE_STATUSES[code]
+
+def read_any_progress_file(progress_file):
+    if progress_file.endswith('.journal'):
+        return read_journal_file(progress_file)
+    return read_progress_file(progress_file)
+
+class ProgressStore:
+    # Persists tags for one GameStore. Every change is appended to a journal
+    # file ("<code>\t<path>" per line) and flushed straight away, so a crash
+    # loses nothing. Once the journal is much longer than the number of
+    # tagged games it is rewritten with only the current state. Compaction
+    # only happens after restore() has read the whole journal, and tags for
+    # paths missing from the loaded gamelist are carried over, not dropped.
+    def __init__(self, journal_path, store, compact_ratio=4, min_compact_lines=1000):
+        self.journal_path = journal_path
+        self.store = store
+        self.compact_ratio = compact_ratio
+        self.min_compact_lines = min_compact_lines
+        self.lines = 0
+        self.file = None
+        self.restored = False
+        self.unknown = {}  # path -> status for journal entries with no game
+
+    def restore(self):
+        # Replays the journal; returns the number of games it tagged
+        applied = 0
+        self.lines = 0
+        self.unknown = {}
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    self.lines += 1
+                    code, _, path = line.rstrip("\n").partition("\t")
+                    if code not in CODE_STATUSES:
+                        continue
+                    game_id = self.store.find_path(path)
+                    if game_id is None:
+                        self.unknown[path] = CODE_STATUSES[code]
+                    else:
+                        self.store.set_status(game_id, CODE_STATUSES[code])
+                        applied += 1
+        self.restored = True
+        return applied
+
+    def import_legacy(self, progress_file):
+        return self.import_entries(read_progress_file(progress_file))
+
+    def import_entries(self, entries):
+        # Tags games from (path, status) pairs; unknown paths are ignored
+        changes = []
+        for path, status in entries:
+            game_id = self.store.find_path(path)
+            if game_id is not None:
+                self.store.set_status(game_id, status)
+                changes.append(game_id)
+        self.record_many(changes)
+        return len(changes)
+
+    def apply(self, changes):
+        # Tags from {game_id: status}; journals only the games that changed
+        # and returns their [(game_id, old_status)] for undo
+        undo = []
+        for game_id, status in changes.items():
+            old_status = self.store.set_status(game_id, status)
+            if old_status != status:
+                undo.append((game_id, old_status))
+        self.record_many([game_id for game_id, _ in undo])
+        return undo
+
+    def export_legacy(self, progress_file):
+        games = self.store.games
+        with open(progress_file, 'w') as file:
+            for i, (header, status) in enumerate(PROGRESS_SECTIONS):
+                file.write(f"{header}\n" if i == 0 else f"\n{header}\n")
+                for game_id in self.store.ids_with_status(status):
+                    file.write(f"{games[game_id]['path']}\n")
+
+    def record(self, game_id):
+        self.record_many([game_id])
+
+    def record_many(self, game_ids):
+        if not game_ids:
+            return
+        if self.file is None:
+            self.file = open(self.journal_path, 'a', encoding='utf-8')
+        games = self.store.games
+        status = self.store.status
+        self.file.write(''.join(f"{STATUS_CODES[status[game_id]]}\t{games[game_id]['path']}\n" for game_id in game_ids))
+        self.file.flush()
+        self.lines += len(game_ids)
+        self.maybe_compact()
+
+    def maybe_compact(self):
+        if not self.restored:
+            return  # The journal may hold tags this store has never seen
+        tagged = len(self.store) - self.store.count(UNTAGGED) + len(self.unknown)
+        if self.lines > max(self.min_compact_lines, self.compact_ratio * tagged):
+            self.compact()
+
+    def compact(self):
+        self.close()
+        games = self.store.games
+        temp_path = self.journal_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            self.lines = 0
+            for path, status in self.unknown.items():
+                file.write(f"{STATUS_CODES[status]}\t{path}\n")
+                self.lines += 1
+            for status in (ACCEPTED, REJECTED, HOLD):
+                for game_id in self.store.ids_with_status(status):
+                    file.write(f"{STATUS_CODES[status]}\t{games[game_id]['path']}\n")
+                    self.lines += 1
+        os.replace(temp_path, self.journal_path)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# Fields read on every repaint/selection get their own slot in GameRecord
+HOT_FIELDS = ('name', 'path', 'region', 'image')
+# Fields only needed by show_game and export are kept on disk until read
+LAZY_FIELDS = ('desc',)
+SPOOL_THRESHOLD = 256
+
+class TextSpool:
+    # Append-only temporary file for large, rarely read field values
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def put(self, text):
+        data = text.encode('utf-8')
+        with self.lock:
+            offset = self.size
+            self.file.seek(offset)
+            self.file.write(data)
+            self.size += len(data)
+        return offset, len(data)
+
+    def get(self, offset, length):
+        with self.lock:
+            self.file.seek(offset)
+            data = self.file.read(length)
+        return data.decode('utf-8')
+
+class GameRecord:
+    # Compact replacement for the per-game dict. Hot fields live in slots and
+    # the remaining values in a tuple aligned with `cold_fields`; long values
+    # (desc) are stored in a TextSpool and kept here as a packed int offset.
+    # `fields` keeps the original tag order so export writes them unchanged.
+    __slots__ = ('name', 'path', 'region', 'image', 'fields', 'cold_fields', 'cold', 'spool')
+
+    def __init__(self, fields, cold_fields, cold, spool):
+        self.fields = fields
+        self.cold_fields = cold_fields
+        self.cold = cold
+        self.spool = spool
+        self.name = self.path = self.region = self.image = None
+
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        if key in HOT_FIELDS:
+            return getattr(self, key)
+        value = self.cold[self.cold_fields.index(key)]
+        if type(value) is int:
+            return self.spool.get(value >> 32, value & 0xFFFFFFFF)
+        return value
+
+    def get(self, key, default=None):
+        if key not in self.fields:
+            return default
+        return self[key]
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def keys(self):
+        return self.fields
+
+    def items(self):
+        return [(key, self[key]) for key in self.fields]
+
+class RecordBuilder:
+    # Turns parsed game dicts into GameRecords, sharing field-order tuples
+    # and repeated short values (regions, ratings...) between games
+    def __init__(self, spool):
+        self.spool = spool
+        self.layouts = {}
+
+    def build(self, game_data):
+        fields = tuple(game_data)
+        layout = self.layouts.get(fields)
+        if layout is None:
+            cold_fields = tuple(key for key in fields if key not in HOT_FIELDS)
+            layout = self.layouts[fields] = (fields, cold_fields)
+        fields, cold_fields = layout
+
+        cold = []
+        for key in cold_fields:
+            value = game_data[key]
+            if value is not None:
+                if key in LAZY_FIELDS or len(value) > SPOOL_THRESHOLD:
+                    offset, length = self.spool.put(value)
+                    value = offset << 32 | length
+                elif len(value) <= 32:
+                    value = sys.intern(value)
+            cold.append(value)
+        record = GameRecord(fields, cold_fields, tuple(cold), self.spool)
+        record.name = game_data.get('name')
+        record.path = game_data.get('path')
+        record.image = game_data.get('image')
+        region = game_data.get('region')
+        record.region = sys.intern(region) if region is not None else None
+        return record
+
+def iter_gamelist(path):
+    # Streams <game> entries with iterparse and clears each element once it
+    # has been turned into a dict, so the whole tree is never held in memory.
+    # Yields (game_data, bytes_read, total_bytes).
+    with open(path, 'rb') as file:
+        total = os.fstat(file.fileno()).st_size
+        depth = 0
+        root = None
+        for event, elem in ET.iterparse(file, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1 and elem.tag == 'game':
+                game_data = {}
+                for child in elem:
+                    game_data[child.tag] = child.text
+                yield game_data, file.tell(), total
+                elem.clear()
+                root.clear()
+
+class GamelistLoader(threading.Thread):
+    # Parses a gamelist off the UI thread and hands games over in batches
+    # through a queue. The first batch is flushed quickly so the list can
+    # show something while the rest of the file is still being read.
+    def __init__(self, path, spool, batch_size=2000, flush_interval=0.1):
+        super().__init__(daemon=True)
+        self.path = path
+        self.builder = RecordBuilder(spool)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        batch = []
+        games = []
+        started = last_flush = time.monotonic()
+        bytes_read = total = 0
+        try:
+            for game_data, bytes_read, total in self.iter_games():
+                if self.cancelled.is_set():
+                    return
+                game = self.builder.build(game_data)
+                batch.append(game)
+                games.append(game)
+                now = time.monotonic()
+                if len(batch) >= self.batch_size or now - last_flush >= self.flush_interval:
+                    self.queue.put(('games', batch, bytes_read, total))
+                    batch = []
+                    last_flush = now
+            self.queue.put(('games', batch, total, total))
+            TIMINGS.add('parse gamelist', time.monotonic() - started)
+            # Game IDs follow the order games were handed over in
+            self.queue.put(('done', find_duplicate_groups(games), total, total))
+        except (ET.ParseError, OSError, sqlite3.Error) as e:
+            self.queue.put(('error', e, bytes_read, total))
+
+    def iter_games(self):
+        return iter_gamelist(self.path)
+
+CATALOG_PATH = os.path.join(os.path.expanduser('~'), '.stop-ou-encore', 'catalog.db')
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.stop-ou-encore', 'cache')
+
+def cache_db_path(console_dir):
+    # Per-system thumbnail and ROM hash cache. Kept on the local disk rather
+    # than in the console directory, which may be a read-only or network
+    # share where SQLite locking and WAL files do not work
+    console_dir = os.path.abspath(console_dir)
+    digest = hashlib.sha1(console_dir.encode('utf-8')).hexdigest()[:12]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, f"{os.path.basename(console_dir)}-{digest}.db")
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS systems (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    console_dir TEXT NOT NULL UNIQUE,
+    gamelist_size INTEGER,
+    gamelist_mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    system_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    path TEXT,
+    name TEXT,
+    letter TEXT,
+    region TEXT,
+    fields TEXT NOT NULL,
+    UNIQUE (system_id, position)
+);
+CREATE INDEX IF NOT EXISTS games_by_path ON games (system_id, path);
+CREATE INDEX IF NOT EXISTS games_by_letter ON games (system_id, letter, position);
+CREATE TABLE IF NOT EXISTS media (
+    game_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (game_id, kind)
+);
+CREATE TABLE IF NOT EXISTS status (
+    system_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    PRIMARY KEY (system_id, path)
+);
+CREATE INDEX IF NOT EXISTS status_by_value ON status (status, system_id);
+"""
+
+class Catalog:
+    # Optional SQLite catalog holding the games, media and tags of many
+    # console directories. A gamelist is only re-ingested when its size or
+    # mtime changed, and tags are keyed by ROM path so they survive that.
+    # Connections are not shared between threads; open one Catalog per thread
+    # unless `shared` is set and the caller serializes access itself.
+    def __init__(self, db_path=CATALOG_PATH, shared=False):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, check_same_thread=not shared)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.executescript(CATALOG_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def system_id(self, console_dir):
+        row = self.connection.execute(
+            "SELECT id FROM systems WHERE console_dir = ?", (os.path.abspath(console_dir),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def systems(self):
+        # (id, name, console_dir, game count) for every ingested system
+        return self.connection.execute(
+            "SELECT s.id, s.name, s.console_dir, (SELECT COUNT(*) FROM games g WHERE g.system_id = s.id)"
+            " FROM systems s ORDER BY s.name"
+        ).fetchall()
+
+    def ingest(self, console_dir, force=False):
+        # Returns (system_id, whether the gamelist was (re)read)
+        console_dir = os.path.abspath(console_dir)
+        name = os.path.basename(console_dir)
+        stat = os.stat(os.path.join(console_dir, 'gamelist.xml'))
+        row = self.connection.execute(
+            "SELECT id, gamelist_size, gamelist_mtime_ns FROM systems WHERE console_dir = ?", (console_dir,)
+        ).fetchone()
+        if row and not force and (row[1], row[2]) == (stat.st_size, stat.st_mtime_ns):
+            return row[0], False
+
+        # Each batch commits on its own so tagging from another connection
+        # is never locked out for the whole ingest. The size and mtime are
+        # only stored at the end, so an interrupted ingest is redone.
+        with self.connection:
+            if row:
+                system_id = row[0]
+                self.connection.execute(
+                    "DELETE FROM media WHERE game_id IN (SELECT id FROM games WHERE system_id = ?)", (system_id,)
+                )
+                self.connection.execute("DELETE FROM games WHERE system_id = ?", (system_id,))
+                self.connection.execute(
+                    "UPDATE systems SET gamelist_size = NULL, gamelist_mtime_ns = NULL WHERE id = ?", (system_id,)
+                )
+            else:
+                system_id = self.connection.execute(
+                    "INSERT INTO systems (name, console_dir) VALUES (?, ?)", (name, console_dir)
+                ).lastrowid
+
+        batch = []
+        for position, (game_data, _, _) in enumerate(iter_gamelist(os.path.join(console_dir, 'gamelist.xml'))):
+            batch.append((position, game_data))
+            if len(batch) >= 1000:
+                self.insert_games(system_id, batch)
+                batch = []
+        self.insert_games(system_id, batch)
+
+        with self.connection:
+            self.connection.execute(
+                "UPDATE systems SET name = ?, gamelist_size = ?, gamelist_mtime_ns = ? WHERE id = ?",
+                (name, stat.st_size, stat.st_mtime_ns, system_id),
+            )
+            journal_path = os.path.join(console_dir, f"{name}_progress.journal")
+            if os.path.exists(journal_path):
+                self.import_journal(system_id, journal_path)
+        return system_id, True
+
+    def insert_games(self, system_id, batch):
+        # batch: list of (position, game_data), written in one transaction
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            next_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM games").fetchone()[0]
+            games = []
+            media = []
+            for game_id, (position, game_data) in enumerate(batch, start=next_id):
+                game_name = game_data.get('name')
+                games.append((
+                    game_id, system_id, position, game_data.get('path'), game_name,
+                    letter_bucket(game_name), game_data.get('region'), json.dumps(list(game_data.items())),
+                ))
+                for kind in MEDIA_KEYS:
+                    if game_data.get(kind):
+                        media.append((game_id, kind, game_data[kind]))
+            self.connection.executemany(
+                "INSERT INTO games (id, system_id, position, path, name, letter, region, fields)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", games,
+            )
+            self.connection.executemany("INSERT OR REPLACE INTO media (game_id, kind, path) VALUES (?, ?, ?)", media)
+
+    def import_journal(self, system_id, journal_path):
+        statuses = {}
+        with open(journal_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                code, _, path = line.rstrip("\n").partition("\t")
+                if code in CODE_STATUSES:
+                    statuses[path] = CODE_STATUSES[code]
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO status (system_id, path, status) VALUES (?, ?, ?)",
+            [(system_id, path, status) for path, status in statuses.items()],
+        )
+
+    def ingest_tree(self, root_dir):
+        # Ingests every sub-directory of root_dir that holds a gamelist.xml
+        results = []
+        for entry in sorted(os.scandir(root_dir), key=lambda entry: entry.name.lower()):
+            if entry.is_dir() and os.path.isfile(os.path.join(entry.path, 'gamelist.xml')):
+                system_id, ingested = self.ingest(entry.path)
+                results.append((entry.name, system_id, ingested))
+        return results
+
+    def count_games(self, system_id):
+        return self.connection.execute("SELECT COUNT(*) FROM games WHERE system_id = ?", (system_id,)).fetchone()[0]
+
+    def iter_hot_games(self, system_id):
+        # (position, path, name, region, image) in gamelist order, without
+        # decoding the full field list of every game
+        return self.connection.execute(
+            "SELECT g.position, g.path, g.name, g.region, m.path FROM games g"
+            " LEFT JOIN media m ON m.game_id = g.id AND m.kind = 'image'"
+            " WHERE g.system_id = ? ORDER BY g.position", (system_id,)
+        )
+
+    def page(self, system_id, start, count):
+        # (path, game dict) for `count` games from position `start`, with the
+        # original fields and tag order
+        rows = self.connection.execute(
+            "SELECT path, fields FROM games WHERE system_id = ? AND position >= ? AND position < ?"
+            " ORDER BY position", (system_id, start, start + count)
+        ).fetchall()
+        return [(path, dict(json.loads(fields))) for path, fields in rows]
+
+    def game_fields(self, system_id, path):
+        row = self.connection.execute(
+            "SELECT fields FROM games WHERE system_id = ? AND path = ?", (system_id, path)
+        ).fetchone()
+        return dict(json.loads(row[0])) if row else {}
+
+    def statuses(self, system_id):
+        return dict(self.connection.execute(
+            "SELECT path, status FROM status WHERE system_id = ?", (system_id,)
+        ).fetchall())
+
+    def set_statuses(self, system_id, entries):
+        # entries: iterable of (path, status), written in one transaction
+        entries = list(entries)
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM status WHERE system_id = ? AND path = ?",
+                [(system_id, path) for path, status in entries if status == UNTAGGED],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO status (system_id, path, status) VALUES (?, ?, ?)",
+                [(system_id, path, status) for path, status in entries if status != UNTAGGED],
+            )
+
+    def games_with_status(self, status):
+        # (system name, game name, path) across every system
+        return self.connection.execute(
+            "SELECT sy.name, g.name, g.path FROM status s"
+            " JOIN systems sy ON sy.id = s.system_id"
+            " JOIN games g ON g.system_id = s.system_id AND g.path = s.path"
+            " WHERE s.status = ? ORDER BY sy.name, g.position", (status,)
+        ).fetchall()
+
+    def status_counts(self):
+        # (system name, total, accepted, rejected, on hold, untagged) per system
+        return self.connection.execute(
+            "SELECT sy.name, COUNT(g.id),"
+            " SUM(COALESCE(s.status, 0) = 1), SUM(COALESCE(s.status, 0) = 2),"
+            " SUM(COALESCE(s.status, 0) = 3), SUM(COALESCE(s.status, 0) = 0)"
+            " FROM systems sy"
+            " LEFT JOIN games g ON g.system_id = sy.id"
+            " LEFT JOIN status s ON s.system_id = g.system_id AND s.path = g.path"
+            " GROUP BY sy.id ORDER BY sy.name"
+        ).fetchall()
+
+class CatalogPages:
+    # Reads the full field lists of a catalog system a page of games at a
+    # time, keeping the most recently used pages. Shared by the UI and the
+    # export threads, so the connection is guarded by a lock.
+    def __init__(self, db_path, system_id, page_size=100, cached_pages=8):
+        self.catalog = Catalog(db_path, shared=True)
+        self.system_id = system_id
+        self.page_size = page_size
+        self.cached_pages = cached_pages
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+
+    def fields(self, position, path):
+        number = position // self.page_size
+        with self.lock:
+            page = self.pages.get(number)
+            if page is None:
+                page = self.catalog.page(self.system_id, number * self.page_size, self.page_size)
+                self.pages[number] = page
+                if len(self.pages) > self.cached_pages:
+                    self.pages.popitem(last=False)
+            else:
+                self.pages.move_to_end(number)
+            index = position - number * self.page_size
+            if index < len(page) and page[index][0] == path:
+                return page[index][1]
+            # Re-ingested since the system was opened: look the game up by path
+            return self.catalog.game_fields(self.system_id, path)
+
+class CatalogRecord:
+    # GameRecord stand-in for systems opened from the catalog: only the hot
+    # fields are held in memory, the rest is read through CatalogPages when
+    # show_game or export asks for it
+    __slots__ = ('name', 'path', 'region', 'image', 'position', 'pages')
+
+    def __init__(self, position, pages):
+        self.position = position
+        self.pages = pages
+        self.name = self.path = self.region = self.image = None
+
+    def load(self):
+        return self.pages.fields(self.position, self.path)
+
+    def __getitem__(self, key):
+        if key in HOT_FIELDS and getattr(self, key) is not None:
+            return getattr(self, key)
+        return self.load()[key]
+
+    def get(self, key, default=None):
+        if key in HOT_FIELDS and getattr(self, key) is not None:
+            return getattr(self, key)
+        return self.load().get(key, default)
+
+    def __contains__(self, key):
+        if key in HOT_FIELDS and getattr(self, key) is not None:
+            return True
+        return key in self.load()
+
+    def keys(self):
+        return tuple(self.load())
+
+    def items(self):
+        return list(self.load().items())
+
+class CatalogLoader(GamelistLoader):
+    # Feeds the UI from the catalog instead of parsing the XML, after a
+    # cheap re-ingest check of the system's gamelist. Only the hot fields
+    # are loaded up front; see CatalogPages.
+    def __init__(self, db_path, console_dir, **kwargs):
+        super().__init__(os.path.join(console_dir, 'gamelist.xml'), None, **kwargs)
+        self.db_path = db_path
+        self.console_dir = console_dir
+        self.builder = self
+        self.pages = None
+
+    def build(self, row):
+        position, path, name, region, image = row
+        record = CatalogRecord(position, self.pages)
+        record.path = path
+        record.name = name
+        record.region = sys.intern(region) if region is not None else None
+        record.image = image
+        return record
+
+    def iter_games(self):
+        catalog = Catalog(self.db_path)
+        try:
+            system_id, _ = catalog.ingest(self.console_dir)
+            self.pages = CatalogPages(self.db_path, system_id)
+            total = catalog.count_games(system_id)
+            for row in catalog.iter_hot_games(system_id):
+                yield row, row[0] + 1, total
+        finally:
+            catalog.close()
+
+class CatalogIngestJob(threading.Thread):
+    def __init__(self, db_path, root_dir):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.root_dir = root_dir
+        self.queue = queue.Queue()
+
+    def run(self):
+        try:
+            catalog = Catalog(self.db_path)
+            try:
+                self.queue.put(('done', catalog.ingest_tree(self.root_dir)))
+            finally:
+                catalog.close()
+        except (ET.ParseError, OSError, sqlite3.Error) as e:
+            self.queue.put(('error', e))
+
+class CatalogWriter(threading.Thread):
+    # Mirrors tag changes into the catalog from its own connection, so a
+    # long ingest never blocks (or raises into) the UI thread. Writes that
+    # still fail are dropped; the next restore resyncs the system.
+    def __init__(self, db_path, retries=20, retry_delay=0.5):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue = queue.Queue()
+
+    def set_statuses(self, system_id, entries):
+        self.queue.put((system_id, list(entries)))
+
+    def close(self):
+        # Flushes the pending writes before returning
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        try:
+            catalog = Catalog(self.db_path)
+        except (OSError, sqlite3.Error):
+            catalog = None
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                if catalog is None:
+                    continue
+                for attempt in range(self.retries):
+                    try:
+                        catalog.set_statuses(*item)
+                        break
+                    except sqlite3.OperationalError:  # locked by an ingest
+                        time.sleep(self.retry_delay)
+        finally:
+            if catalog is not None:
+                catalog.close()
+
+def letter_bucket(name):
+    # Matches the "0-9" and A-Z buttons created in add_letter_buttons
+    if not name:
+        return None
+    if name[0].isdigit():
+        return "0-9"
+    return name[0]
+
+class FilterIndex:
+    # Buckets game IDs by first character; the per-status sets are the ones
+    # kept up to date by the GameStore on every tag change. A letter + status
+    # + search query is therefore a set intersection instead of a full scan.
+    def __init__(self, store):
+        self.store = store
+        self.clear()
+
+    def clear(self):
+        self.letters = {}
+        self.lower_names = []
+        self.blob = None
+        self.offsets = []
+
+    def add(self, game_id, name):
+        self.letters.setdefault(letter_bucket(name), set()).add(game_id)
+        self.lower_names.append((name or '').lower().replace("\n", " "))
+        self.blob = None
+
+    def build_blob(self):
+        # All lowercased names joined by newlines, searched with str.find
+        offsets = []
+        position = 0
+        for name in self.lower_names:
+            offsets.append(position)
+            position += len(name) + 1
+        self.offsets = offsets
+        self.blob = "\n".join(self.lower_names)
+
+    def search(self, text):
+        needle = text.lower().replace("\n", " ")
+        if self.blob is None:
+            self.build_blob()
+        blob = self.blob
+        offsets = self.offsets
+        matches = set()
+        position = blob.find(needle)
+        while position != -1:
+            game_id = bisect_right(offsets, position) - 1
+            matches.add(game_id)
+            if game_id + 1 >= len(offsets):
+                break
+            position = blob.find(needle, offsets[game_id + 1])
+        return matches
+
+    def matches(self, game_id, letter=None, status=None, text=None):
+        if letter and game_id not in self.letters.get(letter, ()):
+            return False
+        if status is not None and self.store.status[game_id] != status:
+            return False
+        if text and text.lower().replace("\n", " ") not in self.lower_names[game_id]:
+            return False
+        return True
+
+    def query(self, letter=None, status=None, text=None, subset=None):
+        sets = []
+        if subset is not None:
+            sets.append(subset)
+        if letter:
+            sets.append(self.letters.get(letter, set()))
+        if status is not None:
+            sets.append(self.store.by_status[status])
+        if text:
+            sets.append(self.search(text))
+        if not sets:
+            return list(range(len(self.store)))
+        if len(sets) == 1:
+            return sorted(sets[0])
+        sets.sort(key=len)
+        return sorted(sets[0].intersection(*sets[1:]))
+
+# Bracketed tags such as (USA), (Europe) (Rev 1), (En,Fr,De) or [!]
+TITLE_TAG_PATTERN = re.compile(r"\s*[\(\[]([^\)\]]*)[\)\]]")
+# Tags that tell genuinely different releases apart and must be kept
+KEPT_TAG_PATTERN = re.compile(r"^(disc|disk|side|cd)\s*\w+$", re.IGNORECASE)
+TRAILING_ARTICLE_PATTERN = re.compile(r"^(.*),\s*(the|a|an)$")
+
+def normalize_title(name):
+    # "Legend of Zelda, The (USA) (Rev 1)" and "The Legend of Zelda (Europe)"
+    # both become "the legend of zelda"
+    if not name:
+        return ""
+    kept = [tag for tag in TITLE_TAG_PATTERN.findall(name) if KEPT_TAG_PATTERN.match(tag.strip())]
+    title = TITLE_TAG_PATTERN.sub("", name).strip().lower()
+    match = TRAILING_ARTICLE_PATTERN.match(title)
+    if match:
+        title = f"{match.group(2)} {match.group(1)}"
+    title = unicodedata.normalize('NFKD', title).encode('ascii', 'ignore').decode('ascii')
+    title = " ".join(re.sub(r"[^0-9a-z]+", " ", " ".join([title] + kept).lower()).split())
+    return title
+
+class DuplicateGroups:
+    # Groups of game IDs considered to be the same game
+    def __init__(self, groups=()):
+        self.groups = sorted(groups)
+        self.group_of = {}
+        for index, group in enumerate(self.groups):
+            for game_id in group:
+                self.group_of[game_id] = index
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __contains__(self, game_id):
+        return game_id in self.group_of
+
+    def ids(self):
+        return set(self.group_of)
+
+def find_duplicate_groups(games, content_keys=None):
+    # Blocks games on their normalized title and, when given, on a ROM
+    # content hash ({game_id: digest}). Games sharing any key end up in the
+    # same group through a union-find, so the whole pass stays linear.
+    parent = {}
+
+    def find(game_id):
+        root = game_id
+        while parent[root] != root:
+            root = parent[root]
+        while parent[game_id] != root:
+            parent[game_id], game_id = root, parent[game_id]
+        return root
+
+    def union(first, second):
+        parent.setdefault(first, first)
+        parent.setdefault(second, second)
+        first_root, second_root = find(first), find(second)
+        if first_root != second_root:
+            parent[max(first_root, second_root)] = min(first_root, second_root)
+
+    first_by_key = {}
+    for game_id, game in enumerate(games):
+        keys = [('title', normalize_title(game.get('name')))]
+        if content_keys and game_id in content_keys:
+            keys.append(('content', content_keys[game_id]))
+        for key in keys:
+            if not key[1]:
+                continue
+            first = first_by_key.setdefault(key, game_id)
+            if first != game_id:
+                union(first, game_id)
+
+    groups = {}
+    for game_id in parent:
+        groups.setdefault(find(game_id), []).append(game_id)
+    return DuplicateGroups(sorted(group) for group in groups.values() if len(group) > 1)
+
+class FileCacheJob(threading.Thread):
+    # Base for jobs filling a cache of per-file results (thumbnails, ROM
+    # hashes) that stay valid while the file's size and mtime are unchanged.
+    # The cache provides key(path), known() -> {key: (file_size, mtime_ns, ...)}
+    # and store_many([(path, entry)]).
+    def __init__(self, workers=None):
+        super().__init__(daemon=True)
+        self.workers = workers or os.cpu_count() or 1
+        self.queue = queue.Queue()
+        self.cancelled = threading.Event()
+        self.total = 0
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def refresh(self, cache, paths, compute, chunksize=8, keep_entries=False):
+        # Runs compute(path) -> (path, entry or None) on a process pool for
+        # every file missing from the cache or changed since, storing the
+        # entries 100 at a time. Returns {path: cached row}, plus the new
+        # entries when keep_entries is set; self.total is the number computed.
+        known = cache.known()
+        results = {}
+        outdated = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            row = known.get(cache.key(path))
+            if row and tuple(row[:2]) == (stat.st_size, stat.st_mtime_ns):
+                results[path] = row
+            elif os.path.isfile(path):
+                outdated.append(path)
+
+        self.total = len(outdated)
+        self.queue.put(('progress', 0, len(outdated)))
+        entries = []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for done, (path, entry) in enumerate(executor.map(compute, outdated, chunksize=chunksize), start=1):
+                if self.cancelled.is_set():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+                if entry is not None:
+                    entries.append((path, entry))
+                    if keep_entries:
+                        results[path] = entry
+                if len(entries) >= 100 or done == len(outdated):
+                    cache.store_many(entries)
+                    entries = []
+                    self.queue.put(('progress', done, len(outdated)))
+        cache.store_many(entries)
+        return results
+
+def hash_rom(rom_path):
+    # Runs in a worker process; returns (path, size, mtime_ns, crc32, sha1)
+    try:
+        stat = os.stat(rom_path)
+        crc = 0
+        sha1 = hashlib.sha1()
+        with open(rom_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(COPY_CHUNK_SIZE), b''):
+                crc = zlib.crc32(chunk, crc)
+                sha1.update(chunk)
+    except OSError:
+        return rom_path, None
+    return rom_path, (stat.st_size, stat.st_mtime_ns, f"{crc:08x}", sha1.hexdigest())
+
+class RomHashCache:
+    # ROM checksums kept in the per-system cache database (cache_db_path)
+    # next to the thumbnails, reused while a file's size and mtime are unchanged
+    def __init__(self, db_path, base_dir):
+        self.base_dir = base_dir
+        self.connection = sqlite3.connect(db_path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS rom_hashes ("
+                " path TEXT PRIMARY KEY,"
+                " file_size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " crc32 TEXT NOT NULL,"
+                " sha1 TEXT NOT NULL)"
+            )
+
+    def key(self, rom_path):
+        return os.path.relpath(rom_path, self.base_dir).replace(os.sep, '/')
+
+    def known(self):
+        return {
+            row[0]: row[1:]
+            for row in self.connection.execute("SELECT path, file_size, mtime_ns, crc32, sha1 FROM rom_hashes")
+        }
+
+    def store_many(self, entries):
+        # entries: iterable of (rom_path, (size, mtime_ns, crc32, sha1))
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO rom_hashes (path, file_size, mtime_ns, crc32, sha1) VALUES (?, ?, ?, ?, ?)",
+                [(self.key(rom_path),) + entry for rom_path, entry in entries],
+            )
+
+    def close(self):
+        self.connection.close()
+
+class RomHashJob(FileCacheJob):
+    # Computes the SHA-1 of every ROM (cached by path, size and mtime) on a
+    # process pool and reports {game_id: sha1} for duplicate detection
+    def __init__(self, db_path, console_dir, games, workers=None):
+        super().__init__(workers)
+        self.db_path = db_path
+        self.console_dir = console_dir
+        self.games = games  # lets the caller tell results for an older load apart
+        self.rom_paths = {}
+        for game_id, game in enumerate(games):
+            if game.get('path'):
+                self.rom_paths.setdefault(os.path.normpath(os.path.join(console_dir, game['path'])), []).append(game_id)
+
+    def run(self):
+        try:
+            cache = RomHashCache(self.db_path, self.console_dir)
+            try:
+                entries = self.refresh(cache, self.rom_paths, hash_rom, keep_entries=True)
+            finally:
+                cache.close()
+            self.queue.put(('done', {
+                game_id: entry[3]
+                for rom_path, entry in entries.items()
+                for game_id in self.rom_paths[rom_path]
+            }))
+        except (OSError, sqlite3.Error, BrokenProcessPool) as e:
+            self.queue.put(('error', e))
+
+STATUS_NAMES = {'untagged': UNTAGGED, 'accepted': ACCEPTED, 'rejected': REJECTED, 'hold': HOLD}
+# Region spellings found in ARRM region fields and No-Intro style name tags
+REGION_ALIASES = {
+    'us': ('us', 'usa', 'u'),
+    'eu': ('eu', 'eur', 'europe', 'e'),
+    'jp': ('jp', 'jpn', 'japan', 'j'),
+    'wor': ('wor', 'world', 'w'),
+}
+REGION_CODES = {alias: code for code, aliases in REGION_ALIASES.items() for alias in aliases}
+
+def game_regions(game):
+    # Canonical region codes from the region field and the name's tags
+    tokens = re.split(r"[,/;\s]+", (game.get('region') or '').lower())
+    for tag in TITLE_TAG_PATTERN.findall(game.get('name') or ''):
+        tokens.extend(token.strip() for token in tag.lower().split(','))
+    return {REGION_CODES.get(token, token) for token in tokens if token}
+
+class TagRule:
+    # A rule maps games to a status; evaluate() returns {game_id: status}
+    def __init__(self, status):
+        self.status = parse_status(status)
+
+    def evaluate(self, context):
+        return dict.fromkeys(self.matches(context), self.status)
+
+    def matches(self, context):
+        raise NotImplementedError
+
+class RegexRule(TagRule):
+    def __init__(self, pattern, status, field='name', ignore_case=True):
+        super().__init__(status)
+        self.pattern = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+        self.field = field
+
+    def matches(self, context):
+        search = self.pattern.search
+        field = self.field
+        return {game_id for game_id, game in enumerate(context.games) if search(game.get(field) or '')}
+
+class RegionRule(TagRule):
+    def __init__(self, regions, status):
+        super().__init__(status)
+        self.regions = {REGION_CODES.get(region.lower(), region.lower()) for region in regions}
+
+    def matches(self, context):
+        return {game_id for game_id in range(len(context.games)) if context.regions(game_id) & self.regions}
+
+class MissingImageRule(TagRule):
+    def __init__(self, status, check_files=True):
+        super().__init__(status)
+        self.check_files = check_files
+
+    def matches(self, context):
+        missing = set()
+        for game_id, game in enumerate(context.games):
+            image = game.get('image')
+            if not image or (self.check_files and not os.path.isfile(os.path.join(context.console_dir, image))):
+                missing.add(game_id)
+        return missing
+
+class BestRegionRule(TagRule):
+    # Keeps the best-ranked region of every duplicate group and tags the
+    # other members of the group with `others`
+    def __init__(self, regions, status='accepted', others='rejected'):
+        super().__init__(status)
+        self.regions = [REGION_CODES.get(region.lower(), region.lower()) for region in regions]
+        self.others = parse_status(others)
+
+    def rank(self, context, game_id):
+        regions = context.regions(game_id)
+        return min((i for i, region in enumerate(self.regions) if region in regions), default=len(self.regions))
+
+    def evaluate(self, context):
+        result = {}
+        for group in context.duplicates.groups:
+            best = min(group, key=lambda game_id: (self.rank(context, game_id), game_id))
+            for game_id in group:
+                result[game_id] = self.status if game_id == best else self.others
+        return result
+
+RULE_TYPES = {
+    'regex': RegexRule,
+    'region': RegionRule,
+    'missing_image': MissingImageRule,
+    'best_region_per_group': BestRegionRule,
+}
+
+def parse_status(value):
+    if value not in STATUS_NAMES:
+        raise ValueError(f"Unknown status {value!r}, expected one of {', '.join(STATUS_NAMES)}")
+    return STATUS_NAMES[value]
+
+def parse_rules(spec):
+    # spec is a list of dicts such as {"match": "regex", "pattern": "\\(Beta\\)", "status": "rejected"}
+    rules = []
+    for entry in spec:
+        options = dict(entry)
+        rule_type = RULE_TYPES.get(options.pop('match', None))
+        if rule_type is None:
+            raise ValueError(f"Unknown rule {entry!r}, expected match to be one of {', '.join(RULE_TYPES)}")
+        try:
+            rules.append(rule_type(**options))
+        except (TypeError, re.error) as e:
+            raise ValueError(f"Invalid rule {entry!r}: {e}") from e
+    return rules
+
+def load_rules(path):
+    # A JSON list of rules, or {"overwrite": true, "rules": [...]} to let the
+    # rules retag games that were already tagged; returns (rules, overwrite)
+    with open(path, 'r', encoding='utf-8') as file:
+        spec = json.load(file)
+    if isinstance(spec, dict):
+        return parse_rules(spec.get('rules', [])), bool(spec.get('overwrite', False))
+    return parse_rules(spec), False
+
+class RuleContext:
+    def __init__(self, games, duplicates, console_dir):
+        self.games = games
+        self.duplicates = duplicates
+        self.console_dir = console_dir
+        self.region_cache = {}
+
+    def regions(self, game_id):
+        regions = self.region_cache.get(game_id)
+        if regions is None:
+            regions = self.region_cache[game_id] = game_regions(self.games[game_id])
+        return regions
+
+class AutoTagPlan:
+    # Status changes proposed by a rule pass, not yet applied to the store
+    def __init__(self, store, changes):
+        self.store = store
+        self.changes = changes
+
+    def __len__(self):
+        return len(self.changes)
+
+    def by_status(self):
+        groups = {}
+        for game_id, status in self.changes.items():
+            groups.setdefault(status, []).append(game_id)
+        return groups
+
+    def resulting_counts(self):
+        counts = {status: self.store.count(status) for status in STATUS_CODES}
+        for game_id, status in self.changes.items():
+            counts[self.store.status[game_id]] -= 1
+            counts[status] += 1
+        return counts
+
+def plan_auto_tag(rules, store, duplicates, console_dir, overwrite=False):
+    # Evaluates every rule over all games at once; for each game the first
+    # rule that has an opinion wins. Hand-tagged games are left alone unless
+    # overwrite is set.
+    context = RuleContext(store.games, duplicates, console_dir)
+    decided = {}
+    for rule in rules:
+        for game_id, status in rule.evaluate(context).items():
+            decided.setdefault(game_id, status)
+    status = store.status
+    changes = {
+        game_id: new_status for game_id, new_status in decided.items()
+        if new_status != status[game_id] and (overwrite or status[game_id] == UNTAGGED)
+    }
+    return AutoTagPlan(store, changes)
+
+# Game fields that point to media files copied along with the ROM
+MEDIA_KEYS = ('image', 'video', 'marquee', 'thumbnail', 'manual', 'rating', 'fanart', 'boxart')
+COPY_CHUNK_SIZE = 1024 * 1024
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+EXPORT_MODES = ('copy', 'hardlink', 'reflink', 'symlink')
+EXPORT_JOURNAL = '.stop-ou-encore-export.journal'
+# FAT/exFAT destinations only keep modification times to 2 seconds
+MTIME_TOLERANCE = 2
+FICLONE = 0x40049409  # Linux ioctl used for reflink copies
+
+class ExportOptions:
+    def __init__(self, mode='copy', incremental=False, verify_hash=False, workers=4):
+        if mode not in EXPORT_MODES:
+            raise ValueError(f"Unknown export mode: {mode}")
+        self.mode = mode
+        self.incremental = incremental
+        self.verify_hash = verify_hash
+        self.workers = workers
+
+class ExportPlan:
+    # Deduplicated list of (source, destination, size) file copies
+    def __init__(self, export_dir):
+        self.export_dir = export_dir
+        self.entries = []
+        self.total_bytes = 0
+
+    def add(self, src, dst, size):
+        self.entries.append((src, dst, size))
+        self.total_bytes += size
+
+    def describe(self, actions=None):
+        transfer_bytes = 0
+        for i, (src, dst, size) in enumerate(self.entries):
+            action = actions[i] if actions else 'copy'
+            if action != 'skip':
+                transfer_bytes += size
+            yield f"{action}: {src} -> {dst} ({format_size(size)})"
+        yield f"{len(self.entries)} files, {format_size(self.total_bytes)} total, {format_size(transfer_bytes)} to transfer"
+
+def plan_export(games, console_dir, export_dir, writer=None):
+    # Every ROM and media file is listed once, however many games or fields
+    # refer to it. Missing files are left out of the plan. When a
+    # GamelistWriter is given, each game is written out as it is planned.
+    plan = ExportPlan(export_dir)
+    seen = set()
+    for game in games:
+        if writer is not None:
+            writer.write_game(game)
+        for key in ('path',) + MEDIA_KEYS:
+            rel_path = game.get(key)
+            if not rel_path:
+                continue
+            src = os.path.normpath(os.path.join(console_dir, rel_path))
+            if src in seen:
+                continue
+            seen.add(src)
+            try:
+                if not os.path.isfile(src):
+                    continue
+                size = os.path.getsize(src)
+            except OSError:
+                continue
+            plan.add(src, os.path.join(export_dir, os.path.relpath(src, console_dir)), size)
+    return plan
+
+class ExportJournal:
+    # Append-only record of the files an export has finished, so that an
+    # interrupted export can resume. Removed once the export completes.
+    def __init__(self, export_dir):
+        self.export_dir = export_dir
+        self.path = os.path.join(export_dir, EXPORT_JOURNAL)
+        self.lock = threading.Lock()
+        self.done = {}
+        self.file = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as file:
+            for line in file:
+                parts = line.rstrip("\n").split("\t", 2)
+                if len(parts) == 3 and parts[0].isdigit() and parts[1].isdigit():
+                    self.done[parts[2]] = (int(parts[0]), int(parts[1]))
+
+    def key(self, dst):
+        return os.path.relpath(dst, self.export_dir).replace(os.sep, '/')
+
+    def is_done(self, dst, src_stat):
+        if self.done.get(self.key(dst)) != (src_stat.st_size, src_stat.st_mtime_ns):
+            return False
+        return os.path.lexists(dst)
+
+    def record(self, dst, src_stat):
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8')
+            self.file.write(f"{src_stat.st_size}\t{src_stat.st_mtime_ns}\t{self.key(dst)}\n")
+            self.file.flush()
+
+    def finish(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+class ExportProgress:
+    # Byte counters shared between the copy workers and the UI
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total_bytes = 0
+        self.total_files = 0
+        self.bytes_done = 0
+        self.files_done = 0
+        self.current = ""
+        self.actions = {}
+
+    def start(self, plan):
+        with self.lock:
+            self.total_bytes = plan.total_bytes
+            self.total_files = len(plan.entries)
+
+    def add_bytes(self, count, current):
+        with self.lock:
+            self.bytes_done += count
+            self.current = current
+
+    def file_done(self, action):
+        with self.lock:
+            self.files_done += 1
+            self.actions[action] = self.actions.get(action, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return self.bytes_done, self.total_bytes, self.files_done, self.total_files, self.current
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+def is_unchanged(src, dst, src_stat, options):
+    # Whether dst already holds what this export mode would put there
+    try:
+        dst_stat = os.lstat(dst)
+    except OSError:
+        return False
+    if options.mode == 'symlink':
+        return os.path.islink(dst) and os.readlink(dst) == os.path.abspath(src)
+    if options.mode == 'hardlink' and os.path.samestat(src_stat, dst_stat):
+        return True
+    if dst_stat.st_size != src_stat.st_size:
+        return False
+    if options.verify_hash:
+        return file_digest(src) == file_digest(dst)
+    return abs(dst_stat.st_mtime - src_stat.st_mtime) <= MTIME_TOLERANCE
+
+def decide_action(src, dst, src_stat, options, journal=None):
+    if journal is not None and journal.is_done(dst, src_stat):
+        return 'skip'
+    if options.incremental and is_unchanged(src, dst, src_stat, options):
+        return 'skip'
+    return options.mode
+
+def copy_with_progress(src, dst, progress=None):
+    buffer = bytearray(COPY_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        while True:
+            count = source.readinto(buffer)
+            if not count:
+                break
+            target.write(view[:count])
+            if progress is not None:
+                progress.add_bytes(count, src)
+    # Keeps the source mtime so incremental exports can compare it later
+    shutil.copystat(src, dst)
+
+def reflink(src, dst):
+    import fcntl  # Only available on POSIX; callers fall back to copying
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    shutil.copystat(src, dst)
+
+def export_file(src, dst, size, action, progress=None):
+    # Writes to a temporary name first so an interrupted copy never looks
+    # complete, then falls back to a plain copy when linking is impossible
+    # (different filesystem, no reflink support...)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    temp_path = dst + '.part'
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+    if action != 'copy':
+        try:
+            if action == 'hardlink':
+                os.link(src, temp_path)
+            elif action == 'symlink':
+                os.symlink(os.path.abspath(src), temp_path)
+            else:
+                reflink(src, temp_path)
+            if progress is not None:
+                progress.add_bytes(size, src)
+        except (OSError, ImportError):
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            action = 'copy'
+    if action == 'copy':
+        copy_with_progress(src, temp_path, progress)
+    os.replace(temp_path, dst)
+    return action
+
+def run_export(plan, options=None, progress=None, cancelled=None, journal=None):
+    # Exports the plan on a bounded thread pool; returns (src, error) pairs
+    options = options or ExportOptions()
+    errors = []
+
+    def export_entry(entry):
+        if cancelled is not None and cancelled.is_set():
+            return
+        src, dst, size = entry
+        try:
+            src_stat = os.stat(src)
+            action = decide_action(src, dst, src_stat, options, journal)
+            if action == 'skip':
+                if progress is not None:
+                    progress.add_bytes(size, src)
+            else:
+                with TIMINGS.measure('export file'):
+                    action = export_file(src, dst, size, action, progress)
+            if journal is not None:
+                journal.record(dst, src_stat)
+        except OSError as e:
+            errors.append((src, e))
+            action = 'error'
+        if progress is not None:
+            progress.file_done(action)
+
+    with ThreadPoolExecutor(max_workers=options.workers, thread_name_prefix="export") as executor:
+        for _ in executor.map(export_entry, plan.entries):
+            pass
+    return errors
+
+# minidom escaped quotes in text nodes too; keep the output byte-identical
+XML_TEXT_ENTITIES = {'"': '&quot;'}
+
+class GamelistWriter:
+    # Streams gamelist.xml one <game> at a time, in the same layout the old
+    # minidom toprettyxml() round trip produced. The file is written under a
+    # temporary name and only replaces the target once it is complete.
+    def __init__(self, path, indent="  "):
+        self.path = path
+        self.temp_path = path + '.part'
+        self.indent = indent
+        self.file = open(self.temp_path, 'w', encoding='utf-8')
+        self.file.write('<?xml version="1.0" ?>\n<gameList>\n')
+
+    def write_game(self, game):
+        indent = self.indent
+        lines = [f"{indent}<game>\n"]
+        for key, value in game.items():
+            if value:
+                lines.append(f"{indent * 2}<{key}>{escape(value, XML_TEXT_ENTITIES)}</{key}>\n")
+            else:
+                lines.append(f"{indent * 2}<{key}/>\n")
+        lines.append(f"{indent}</game>\n")
+        self.file.write(''.join(lines))
+
+    def close(self):
+        self.file.write('</gameList>\n')
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+class ExportJob(threading.Thread):
+    # Plans and runs an export off the UI thread
+    def __init__(self, games, console_dir, export_dir, options=None, dry_run=False):
+        super().__init__(daemon=True)
+        self.games = games
+        self.console_dir = console_dir
+        self.export_dir = export_dir
+        self.options = options or ExportOptions()
+        self.dry_run = dry_run
+        self.progress = ExportProgress()
+        self.queue = queue.Queue()
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        journal = None
+        try:
+            if self.dry_run:
+                plan = plan_export(self.games, self.console_dir, self.export_dir)
+            else:
+                os.makedirs(self.export_dir, exist_ok=True)
+                with GamelistWriter(os.path.join(self.export_dir, 'gamelist.xml')) as writer:
+                    plan = plan_export(self.games, self.console_dir, self.export_dir, writer)
+            self.progress.start(plan)
+            journal = ExportJournal(self.export_dir)
+            journal.load()
+            if self.dry_run:
+                actions = []
+                for src, dst, size in plan.entries:
+                    actions.append(decide_action(src, dst, os.stat(src), self.options, journal))
+                self.queue.put(('planned', (plan, actions)))
+                return
+            errors = run_export(plan, self.options, self.progress, self.cancelled, journal)
+            if errors or self.cancelled.is_set():
+                journal.close()
+            else:
+                journal.finish()
+            self.queue.put(('done', (plan, errors)))
+        except OSError as e:
+            if journal is not None:
+                journal.close()
+            self.queue.put(('error', e))